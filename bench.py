@@ -1,14 +1,22 @@
-import timeit
-
-setup = """
+"""Benchmark the envs and agents.
 
-from mcts.checkers import PyCheckersEnv, CCheckersEnv
-from mcts.connectfour import PyConnectFourEnv, CConnectFourEnv
-from mcts.tictactoe import PyTicTacToeEnv, CTicTacToeEnv
+Run all benchmarks, or only those named on the command line.
+"""
 
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
 
 import numpy as np
-import random
+
+from mcts.agents import (MCTSAgent, ArrayMCTSAgent, LeafParallelMCTSAgent, NativeMCTSAgent,
+                         RootParallelMCTSAgent, TreeParallelMCTSAgent)
+from mcts.checkers import PyCheckersEnv, CCheckersEnv, VecCheckersEnv
+from mcts.connectfour import CConnectFourEnv, VecConnectFourEnv
+from mcts.tictactoe import VecTicTacToeEnv
 
 
 def simulate(env):
@@ -21,10 +29,127 @@ def simulate(env):
     return total_rewards
 
 
-env1 = PyCheckersEnv()
-env2 = CCheckersEnv()
+def tree_stats(agent):
+    """Return the number of simulations, nodes and bytes of node data in the agent's tree."""
+    if isinstance(agent, ArrayMCTSAgent):
+        return agent.tree.visits[0], len(agent.tree), agent.tree.nbytes
+    nodes, nbytes, stack = 0, 0, [agent.root]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        nbytes += (sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.children)
+                   + sys.getsizeof(node.value) + sys.getsizeof(node.reward))
+        stack.extend(node.children)
+    return agent.root.visits, nodes, nbytes
+
+
+def match(agent1, agent2, games, Env):
+    """Return the mean score of agent1 against agent2, alternating the first player."""
+    score = 0
+    for game in range(games):
+        agents = [agent1, agent2] if game % 2 == 0 else [agent2, agent1]
+        env = Env()
+        total_rewards = np.zeros(env.players)
+        while not env.done:
+            _, rewards, _, _ = env.step(agents[env.turn].act(env))
+            total_rewards += rewards
+        score += (total_rewards[game % 2] + 1) / 2
+    return score / games
+
+
+def random_games(vec, games):
+    """Return the number of random games finished per second by a vectorized env."""
+    start, finished, seed = time.perf_counter(), 0, 0
+    vec.reset()
+    while finished < games:
+        _, _, dones, _ = vec.step(vec.random_actions(seed))
+        finished += dones.sum()
+        seed += 1
+    return finished / (time.perf_counter() - start)
+
+
+def envs():
+    """Time random Checkers games with the Python and Cython envs."""
+    env1, env2 = PyCheckersEnv(), CCheckersEnv()
+    print('Python:', timeit.timeit(lambda: simulate(env1), number=1000))
+    print('Cython:', timeit.timeit(lambda: simulate(env2), number=1000))
+
+
+def trees():
+    """Compare the speed and node size of the object and array trees."""
+    for agent in [MCTSAgent(timeout=5.0), ArrayMCTSAgent(timeout=5.0)]:
+        agent.act(CConnectFourEnv())
+        simulations, nodes, nbytes = tree_stats(agent)
+        print(f'{type(agent).__name__}: {simulations / agent.timeout:.0f} simulations/s, '
+              f'{nbytes / nodes:.0f} bytes/node')
+
+
+def leaf_parallel():
+    """Compare the playouts of serial and leaf-parallel searches."""
+    env = CCheckersEnv()
+    print('Cython rollout:', timeit.timeit(lambda: env.rollout(1000, 0), number=1))
+    for agent in [MCTSAgent(), LeafParallelMCTSAgent()]:
+        agent.act(CConnectFourEnv())
+        print(f'{type(agent).__name__}: {agent.root.visits / agent.timeout:.0f} playouts/s')
+
+
+def root_parallel():
+    """Compare the simulations per move of serial and root-parallel searches."""
+    serial, parallel = MCTSAgent(), RootParallelMCTSAgent()
+    parallel.act(CConnectFourEnv())  # start the workers
+    for agent in [serial, parallel]:
+        agent.act(CConnectFourEnv())
+    print(f'RootParallelMCTSAgent: {parallel.simulations / serial.root.visits:.1f}x simulations per move '
+          f'with {parallel.workers} workers')
+    parallel.close()
+
+
+def tree_parallel():
+    """Time the tree-parallel search with one thread and with one thread per CPU."""
+    for threads in sorted({1, os.cpu_count()}):
+        agent = TreeParallelMCTSAgent(threads=threads)
+        agent.act(CConnectFourEnv())
+        print(f'TreeParallelMCTSAgent: {agent.simulations / agent.timeout:.0f} simulations/s '
+              f'with {threads} threads')
+
+
+def native():
+    """Compare the simulations per second of the Python and native searches."""
+    for agent in [MCTSAgent(), NativeMCTSAgent()]:
+        agent.act(CConnectFourEnv())
+        print(f'{type(agent).__name__}: {agent.simulations / agent.timeout:.0f} simulations/s')
+
+
+def playouts():
+    """Time uniform and heavy playouts and compare their strength in the native search."""
+    env = CCheckersEnv()
+    for heavy in [False, True]:
+        print(f'Cython playout (heavy={heavy}):',
+              timeit.timeit(lambda: env.playout(0, heavy), number=1000))
+    print(f"NativeMCTSAgent: heavy playouts score "
+          f"{match(NativeMCTSAgent(timeout=0.01, rollout_policy='heavy'), NativeMCTSAgent(timeout=0.01), 20, CConnectFourEnv):.2f} "
+          f"against uniform playouts at equal time")
+
+
+def vectorized():
+    """Time random games in the vectorized envs."""
+    for vec in [VecTicTacToeEnv(4096), VecConnectFourEnv(4096), VecCheckersEnv(1024)]:
+        print(f'{type(vec).__name__}: {random_games(vec, 10000):.0f} random games/s')
+
+
+BENCHMARKS = {benchmark.__name__: benchmark
+              for benchmark in [envs, trees, leaf_parallel, root_parallel, tree_parallel, native,
+                                playouts, vectorized]}
 
-"""
 
-print('Python:', timeit.timeit('simulate(env1)', setup=setup, number=1000))
-print('Cython:', timeit.timeit('simulate(env2)', setup=setup, number=1000))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmarks',
+                        nargs='*',
+                        help=f'the benchmarks to run, from {", ".join(BENCHMARKS)}, by default all')
+    names = parser.parse_args().benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name!r}')
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,43 @@
+"""Build an opening book from long searches of the first moves of a game."""
+
+import argparse
+
+from mcts.agents import NativeMCTSAgent, ucb
+from mcts.book import build_book
+from mcts.checkers import CCheckersEnv
+from mcts.connectfour import CConnectFourEnv
+
+
+def make_parser():
+    """Return the command line argument parser for this script."""
+    parser = argparse.ArgumentParser(description="Build an opening book")
+    parser.add_argument('path',
+                        help='the book file to write')
+    parser.add_argument('--env',
+                        choices=['ConnectFour', 'Checkers'],
+                        default='ConnectFour',
+                        help='the game')
+    parser.add_argument('--depth',
+                        type=int,
+                        default=4,
+                        help='the number of moves from the initial position to include')
+    parser.add_argument('--width',
+                        type=int,
+                        help='the number of most visited moves to follow from each position, instead of all')
+    parser.add_argument('--timeout',
+                        type=float,
+                        default=10.0,
+                        help='timeout in seconds for the search of each position')
+    parser.add_argument('--c',
+                        type=float,
+                        default=1.4,
+                        help='the value of c of the ucb tree policy')
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_parser().parse_args()
+    env = CConnectFourEnv() if args.env == 'ConnectFour' else CCheckersEnv()
+    agent = NativeMCTSAgent(tree_policy=ucb(c=args.c), timeout=args.timeout)
+    positions = build_book(args.path, env, agent, args.depth, args.width)
+    print(f'{positions} positions written to {args.path}')
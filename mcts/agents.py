@@ -1,6 +1,9 @@
 """Implementation of agents."""
 
-from collections import deque
+import copy
+import multiprocessing
+import os
+import threading
 import time
 import random
 import numpy as np
@@ -13,39 +16,197 @@ class RandomAgent:
         return random.choice(env.actions)
 
 
+class EpsilonGreedyPolicy:
+    """An epsilon-greedy tree policy.
+
+    Parameters
+    ----------
+    epsilon : float, optional
+        The probability of choosing a child uniformly at random.
+
+    """
+
+    def __init__(self, epsilon=0.09):
+        self.epsilon = epsilon
+
+    def __call__(self, node):
+        """Return the chosen child of node."""
+        visits, values = child_stats(node)
+        return node.children[self.select(visits, values, node.visits)]
+
+    def select(self, visits, values, parent_visits):
+        """Return the index of the chosen child from arrays of child statistics.
+
+        Parameters
+        ----------
+        visits : array
+            The visit counts of the children.
+        values : array
+            The values of the children for the player to move.
+        parent_visits : int
+            The visit count of the parent.
+
+        """
+        if random.random() < self.epsilon:
+            return random.randrange(len(visits))
+        else:
+            return int(values.argmax())
+
+
+class UCBPolicy:
+    """An upper confidence bound tree policy.
+
+    Unvisited children are chosen first, in order.
+
+    Parameters
+    ----------
+    c : float, optional
+        The exploration constant.
+
+    """
+
+    def __init__(self, c=np.sqrt(2)):
+        self.c = c
+
+    def __call__(self, node):
+        """Return the chosen child of node."""
+        visits, values = child_stats(node)
+        return node.children[self.select(visits, values, node.visits)]
+
+    def select(self, visits, values, parent_visits):
+        """Return the index of the chosen child from arrays of child statistics.
+
+        Parameters
+        ----------
+        visits : array
+            The visit counts of the children.
+        values : array
+            The values of the children for the player to move.
+        parent_visits : int
+            The visit count of the parent.
+
+        """
+        i = visits.argmin()
+        if visits[i] == 0:
+            return int(i)
+        return int((values + self.c * np.sqrt(np.log(parent_visits) / visits)).argmax())
+
+
+class RAVEPolicy:
+    """A rapid action value estimation tree policy.
+
+    The value of each child is blended with its all-moves-as-first (AMAF)
+    value, the mean return of the simulations through the parent in which
+    the player to move made the child's action at any later point. The AMAF
+    value gets weight sqrt(k / (3 n + k)) for a child with n visits, and an
+    upper confidence bound term is added. Unvisited children are chosen
+    first, in order of AMAF value. MCTSAgent keeps AMAF statistics when
+    given this policy.
+
+    Parameters
+    ----------
+    c : float, optional
+        The exploration constant.
+    k : float, optional
+        The number of visits at which the value and the AMAF value have
+        equal weight.
+
+    """
+
+    def __init__(self, c=0.5, k=100):
+        self.c = c
+        self.k = k
+
+    def __call__(self, node):
+        """Return the chosen child of node."""
+        visits, values = child_stats(node)
+        amaf_values = np.array([child.amaf_value for child in node.children])
+        return node.children[self.select(visits, values, node.visits, amaf_values)]
+
+    def select(self, visits, values, parent_visits, amaf_values):
+        """Return the index of the chosen child from arrays of child statistics.
+
+        Parameters
+        ----------
+        visits : array
+            The visit counts of the children.
+        values : array
+            The values of the children for the player to move.
+        parent_visits : int
+            The visit count of the parent.
+        amaf_values : array
+            The AMAF values of the children for the player to move.
+
+        """
+        unvisited = visits == 0
+        if unvisited.any():
+            return int(np.where(unvisited, amaf_values, -np.inf).argmax())
+        beta = np.sqrt(self.k / (3 * visits + self.k))
+        scores = (1 - beta) * values + beta * amaf_values
+        return int((scores + self.c * np.sqrt(np.log(parent_visits) / visits)).argmax())
+
+
 def epsilon_greedy(epsilon=0.09):
     """Return an epsilon-greedy tree policy."""
-    def policy(node):
-        if random.random() < epsilon:
-            return random.choice(node.children)
-        else:
-            return max(node.children, key=lambda n: n.value[node.env.turn])
-    return policy
+    return EpsilonGreedyPolicy(epsilon)
 
 
 def ucb(c=np.sqrt(2)):
     """Return an upper confidence bound tree policy."""
-    def policy(node):
-        def v(n):
-            if n.visits == 0:
-                return np.inf
-            else:
-                return n.value[node.env.turn] + c * np.sqrt(np.log(node.visits)/n.visits)
-        return max(node.children, key=v)
-    return policy
+    return UCBPolicy(c)
+
+
+def rave(c=0.5, k=100):
+    """Return a rapid action value estimation tree policy."""
+    return RAVEPolicy(c, k)
+
+
+def child_stats(node):
+    """Return arrays of visits and values for the player to move of the children of node."""
+    visits = np.array([child.visits for child in node.children])
+    if isinstance(node, ZeroSumTreeNode):
+        values = np.array([child.value for child in node.children])
+    else:
+        turn = node.env.turn
+        values = np.array([child.value[turn] for child in node.children])
+    return visits, values
 
 
 class TreeNode:
-    """A tree node for Monte Carlo tree search."""
+    """A tree node for Monte Carlo tree search.
 
-    def __init__(self, parent, action, reward, env):
+    The value starts as value if given, else as zeros for all players.
+    """
+
+    def __init__(self, parent, action, reward, env, value=None):
         self.parent = parent
         self.children = []
         self.action = action
         self.reward = reward
         self.env = env
         self.visits = 0
-        self.value = np.zeros(env.players)
+        self.value = np.zeros(env.players) if value is None else value
+        self.size = 1
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.untried = None
+        self.proven = None
+        self.amaf_visits = 0
+        self.amaf_value = 0.0
+        self.child_actions = None
+
+
+class ZeroSumTreeNode(TreeNode):
+    """A tree node for two-player zero-sum games with scalar statistics.
+
+    The reward is that of the first player, and the value is the mean return
+    of the player who made the action leading to the node, whose sign
+    relative to the first player is kept in sign.
+    """
+
+    def __init__(self, parent, action, reward, env):
+        super().__init__(parent, action, float(reward[0]), env, 0.0)
+        mover = 1 - env.turn if parent is None else parent.env.turn
+        self.sign = 1.0 if mover == 0 else -1.0
 
 
 class MCTSAgent:
@@ -56,14 +217,137 @@ class MCTSAgent:
     tree_policy : function
         A function which maps node to child node.
     timeout : float, optional
-        The amount of time in seconds to perform rollouts before choosing an action.
+        The amount of time in seconds to perform rollouts before choosing an
+        action, or None for no time limit.
+    iterations : int, optional
+        If given, the number of simulations to perform before choosing an action.
+    nodes : int, optional
+        If given, the number of nodes to add to the tree before choosing an action.
+    rollout_policy : str, optional
+        How simulations play out games: 'python' for uniformly random moves
+        chosen in Python or, with envs that have a native playout method such
+        as the Cython envs, 'random' for uniformly random moves and 'heavy'
+        for the heavy playout policy of the env. The heavy policy takes a
+        winning move, else blocks a winning move of the opponent in
+        Tic-Tac-Toe and Connect Four, or makes captures and promotions in
+        Checkers.
+    zero_sum : bool, optional
+        Whether the game is a two-player zero-sum game, so that each node can
+        keep one scalar value for the player who moved into it and update it
+        in place, instead of an array of values for all players.
+    table_size : int, optional
+        If given, the number of slots in a transposition table through which
+        nodes for the same position and side to move at the same depth are
+        shared, turning the tree into a directed acyclic graph. Each slot holds
+        the most recently created node hashed to it. This requires envs with a
+        hash property, such as the Cython envs.
+    lazy : bool, optional
+        Whether to add children one at a time, creating a child env only when
+        the search reaches a node with untried actions, instead of adding all
+        children of a leaf at once.
+    action_order : str or function, optional
+        The order in which untried actions are expanded when lazy: 'random',
+        'priority' for the order of the priorities property of the env, such
+        as the captures and promotions first of the Cython Checkers env, or a
+        function mapping env and action to a priority, highest first. Ties
+        are broken at random for 'priority'.
+    widening : tuple of float, optional
+        If given as (c, alpha), progressive widening: a node with n visits
+        has at most 1 + int(c * n ** alpha) children, added lazily in the
+        action order.
+    max_nodes : int, optional
+        If given, the number of nodes the tree may hold, including the part
+        kept from earlier moves. One expansion may go over it.
+    on_full : str, optional
+        What to do when the tree holds max_nodes nodes: 'prune' to remove
+        the subtrees of the least visited nodes until it holds half as many,
+        keeping the statistics of their roots, or 'freeze' to stop adding
+        nodes and continue with simulations from the leaves of the tree.
+    early_stop : bool, optional
+        Whether to stop as soon as the simulations left in the iteration or
+        time budget cannot change the child with the most visits, and to
+        return at once when there is only one action.
+    ponder : bool, optional
+        Whether to keep searching from the chosen child in a background
+        thread after act returns, until the next call to act or to
+        stop_pondering. The next act continues from the reply found in that
+        tree, so the simulations run on the opponent's time count toward the
+        next decision. Pondering also stops once it has added nodes nodes
+        or the tree holds max_nodes nodes.
+    solver : bool, optional
+        Whether to prove the values of nodes as in MCTS-Solver. A terminal
+        node is proven, and so is a node with a proven child that wins for
+        the player to move, or with all children proven. The proven value of
+        a node is the exact return from it, which is used in place of
+        random games. The search does not descend below proven nodes, nor
+        into proven children while a sibling is unproven, and stops when
+        the root is proven, choosing its best proven child. This
+        assumes that a positive return is a win and can not be improved on.
+    exact : function, optional
+        If given, a function mapping env to the exact total rewards of the
+        players from it under perfect play, or None if unknown, such as
+        mcts.tictactoe.PerfectPlayTable. Nodes for known positions are
+        proven when created, so the search does not descend below them and
+        act returns at once when all actions from the root are known.
+    book : OpeningBook, optional
+        If given, an opening book from mcts.book consulted before searching.
+        The action with the most visits in the book is returned at once for
+        positions in it, and the tree is dropped.
+
+    The search stops when the first of the given budgets is used up. The
+    clock is read with time.perf_counter, only every check_every simulations
+    or fewer when the time limit is close. The number of nodes in the tree
+    is kept in tree_size and its largest value in peak_size, and the number
+    of simulations run by the last pondering in pondered. With a
+    transposition table, tree_size is exact only when max_nodes is given,
+    as the nodes kept from earlier moves are then counted on each move.
 
     """
 
-    def __init__(self, tree_policy=ucb(), timeout=1.0):
+    check_every = 16
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, iterations=None, nodes=None,
+                 rollout_policy='python', zero_sum=False, table_size=None, lazy=False,
+                 action_order='random', widening=None, max_nodes=None, on_full='prune',
+                 early_stop=False, ponder=False, solver=False, exact=None, book=None):
+        if timeout is None and iterations is None and nodes is None:
+            raise ValueError('no search budget given')
+        if on_full not in ('prune', 'freeze'):
+            raise ValueError(f'unknown on_full {on_full!r}')
+        if rollout_policy not in ('python', 'random', 'heavy'):
+            raise ValueError(f'unknown rollout_policy {rollout_policy!r}')
+        if isinstance(tree_policy, RAVEPolicy) and rollout_policy != 'python':
+            raise ValueError("AMAF statistics need rollout_policy 'python'")
         self.tree_policy = tree_policy
         self.timeout = timeout
+        self.iterations = iterations
+        self.nodes = nodes
+        self.rollout_policy = rollout_policy
+        self.zero_sum = zero_sum
+        self.node_type = ZeroSumTreeNode if zero_sum else TreeNode
+        self.amaf = isinstance(tree_policy, RAVEPolicy)
+        self.rollout_actions = []
+        self.lazy = lazy or widening is not None
+        self.action_order = action_order
+        self.widening = widening
+        self.table_size = table_size
+        self.table = None if table_size is None else [None] * table_size
         self.root = None
+        self.chosen = None
+        self.max_nodes = max_nodes
+        self.on_full = on_full
+        self.early_stop = early_stop
+        self.solver = solver
+        self.exact = exact
+        self.book = book
+        self.ponder = ponder
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+        self.pondered = 0
+        self.simulations = 0
+        self.nodes_added = 0
+        self.tree_size = 0
+        self.peak_size = 0
 
     def act(self, env):
         """Return a chosen action for the env.
@@ -74,55 +358,954 @@ class MCTSAgent:
             The current environment.
 
         """
+        self.stop_pondering()
+        action = self.book_move(env)
+        if action is not None:
+            return action
         self.root = self.find_root(env)
-        limit = time.time() + self.timeout
-        while time.time() < limit:
+        if self.root.proven is not None and not self.root.children and self.exact is None:
+            # the children that proved the root were pruned, so prove it again
+            self.root.proven = None
+        self.simulations = 0
+        self.nodes_added = 0
+        start = time.perf_counter()
+        batch = self.batch_size(start)
+        while batch > 0:
+            for _ in range(batch):
+                leaf = self.expand(self.root)
+                value = self.simulate(leaf)
+                self.backup(leaf, value)
+            self.simulations += batch
+            batch = self.batch_size(start)
+        if not self.root.children:
+            if self.root.proven is not None:
+                self.root.untried = []
+                for action in self.root.env.actions:
+                    self.add_child(self.root, action)
+            else:
+                self.expand(self.root)
+        self.peak_size = max(self.peak_size, self.tree_size)
+        if self.root.proven is not None:
+            turn = self.root.env.turn
+            proven = [child for child in self.root.children if child.proven is not None]
+            self.chosen = max(proven, key=lambda node: (exact_value(node)[turn], node.visits))
+        elif self.solver or self.exact is not None:
+            self.chosen = self.choose_unproven()
+        else:
+            self.chosen = max(self.root.children, key=lambda node: node.visits)
+        if self.table is not None:
+            self.reach(self.root, self.chosen)
+        if self.ponder and not self.chosen.env.done and self.chosen.proven is None:
+            self.start_pondering()
+        return self.chosen.action
+
+    def book_move(self, env):
+        """Return the book action for env and drop the tree, or None if env is not in the book."""
+        if self.book is None:
+            return None
+        action = self.book.move(env)
+        if action is not None:
+            self.root = self.chosen = None
+            self.simulations = 0
+            self.nodes_added = 0
+        return action
+
+    def choose_unproven(self):
+        """Return the child to play from an unproven root.
+
+        This is the most visited unproven child, unless a proven child has
+        an exact value at least as high as its mean value for the player to
+        move, as the search spends no simulations on proven children.
+        """
+        turn = self.root.env.turn
+        unproven = [child for child in self.root.children if child.proven is None]
+        proven = [child for child in self.root.children if child.proven is not None]
+        if not unproven:
+            return max(proven, key=lambda node: (exact_value(node)[turn], node.visits))
+        chosen = max(unproven, key=lambda node: node.visits)
+        if proven:
+            best = max(proven, key=lambda node: exact_value(node)[turn])
+            value = chosen.value if isinstance(chosen, ZeroSumTreeNode) else chosen.value[turn]
+            if exact_value(best)[turn] >= value:
+                return best
+        return chosen
+
+    def start_pondering(self):
+        """Start searching from the chosen child in a background thread.
+
+        The chosen child becomes the root, and the rest of the tree is dropped.
+        """
+        self.root = self.chosen
+        self.reroot(self.root)
+        self.pondered = 0
+        self.ponder_stop.clear()
+        self.ponder_thread = threading.Thread(target=self.ponder_search, daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_search(self):
+        """Run simulations from the root until pondering is stopped or a node budget is used up."""
+        self.nodes_added = 0
+        while (not self.ponder_stop.is_set() and self.root.proven is None and not self.full()
+               and (self.nodes is None or self.nodes_added < self.nodes)):
             leaf = self.expand(self.root)
             value = self.simulate(leaf)
             self.backup(leaf, value)
-        return max(self.root.children, key=lambda node: node.visits).action
+            self.pondered += 1
+        self.peak_size = max(self.peak_size, self.tree_size)
+
+    def stop_pondering(self):
+        """Stop the background search, if any, and wait for it to finish."""
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
+    def batch_size(self, start):
+        """Return the number of simulations to perform before checking the budgets again."""
+        if self.nodes is not None and self.nodes_added >= self.nodes:
+            return 0
+        if (self.solver or self.exact is not None) and self.root.proven is not None:
+            return 0
+        remaining = self.remaining_simulations(start)
+        if remaining <= 0 or (self.early_stop and self.decided(remaining)):
+            return 0
+        if self.nodes is not None:
+            return 1
+        return max(1, int(min(self.check_every, remaining)))
+
+    def remaining_simulations(self, start):
+        """Return the number of simulations left in the iteration and time budgets.
+
+        The simulations that fit in the time left are estimated from the
+        rate so far, and are unbounded before the first simulation.
+        """
+        remaining = float('inf')
+        if self.iterations is not None:
+            remaining = self.iterations - self.simulations
+        if self.timeout is not None:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.timeout:
+                return 0
+            if self.simulations > 0:
+                remaining = min(remaining, (self.timeout - elapsed) * self.simulations / elapsed)
+        return remaining
+
+    def decided(self, remaining):
+        """Return whether remaining simulations cannot change the child with the most visits."""
+        if len(self.root.env.actions) == 1:
+            return True
+        if not self.root.children:
+            return False
+        visits = sorted(child.visits for child in self.root.children)
+        second = visits[-2] if len(visits) > 1 else 0
+        return visits[-1] - second > remaining
 
     def expand(self, node):
         """Return an unvisited or terminal leaf node following the tree policy.
 
         Before returning, this function performs all possible actions from the
         leaf node and adds new nodes for them to the tree as children of the
-        leaf node.
+        leaf node. When lazy, it instead stops at the first node with untried
+        actions and returns a new child for one of them. No nodes are added
+        when the tree is full and frozen, and proven nodes are not expanded.
         """
-        while node.visits != 0 and len(node.children) > 0:
-            node = self.tree_policy(node)
-        if not node.env.done:
-            for action in node.env.actions:
-                env = node.env.copy()
-                _, reward, _, _ = env.step(action)
-                node.children.append(TreeNode(node, action, reward, env))
+        if self.full() and self.on_full == 'prune':
+            self.prune()
+        if self.lazy:
+            node = self.expand_lazy(node)
+        else:
+            while node.visits != 0 and len(node.children) > 0 and node.proven is None:
+                node = self.select(node)
+            if not node.env.done and node.proven is None and not self.full():
+                for action in node.env.actions:
+                    self.add_child(node, action)
+        if self.solver:
+            self.prove(node)
+        return node
+
+    def expand_lazy(self, node):
+        """Return a new child of the first node with untried actions following the tree policy."""
+        while not node.env.done and node.proven is None:
+            if node.untried is None:
+                node.untried = self.order_actions(node.env)
+            if node.untried and not self.full() and self.can_widen(node):
+                return self.add_child(node, node.untried.pop())
+            if not node.children:
+                break
+            node = self.select(node)
+        return node
+
+    def prove(self, node):
+        """Mark node and then its ancestors as proven, as long as their children decide them."""
+        while node is not None:
+            if node.proven is None:
+                if node.env.done:
+                    node.proven = np.zeros(node.env.players)
+                else:
+                    node.proven = self.proven_value(node)
+                    if node.proven is None:
+                        return
+            node = node.parent
+
+    def proven_value(self, node):
+        """Return the exact return from node decided by its proven children, or None."""
+        turn = node.env.turn
+        best = None
+        complete = len(node.children) > 0 and (not self.lazy or node.untried == [])
+        for child in node.children:
+            if child.proven is None:
+                complete = False
+                continue
+            value = exact_value(child)
+            if best is None or value[turn] > best[turn]:
+                best = value
+        if best is not None and (complete or best[turn] > 0):
+            return best
+        return None
+
+    def can_widen(self, node):
+        """Return whether progressive widening allows another child of node."""
+        if self.widening is None:
+            return True
+        c, alpha = self.widening
+        return len(node.children) < 1 + int(c * node.visits ** alpha)
+
+    def full(self):
+        """Return whether the tree holds max_nodes nodes."""
+        return self.max_nodes is not None and self.tree_size >= self.max_nodes
+
+    def prune(self):
+        """Remove the subtrees of the least visited nodes until the tree holds max_nodes // 2 nodes.
+
+        The pruned nodes become leaves that keep their statistics and are
+        expanded again when the search reaches them. The transposition table
+        is cleared so that no removed node is found through it. Nodes shared
+        through the table may stay reachable from other parents, so the
+        distinct reachable nodes are counted again after each round.
+        Without a table, a node has no more visits than its ancestors, so
+        the subtrees below a node are pruned before it and its size is
+        exact when it is pruned.
+        """
+        self.peak_size = max(self.peak_size, self.tree_size)
+        expanded = [node for node in walk(self.root) if node.children and node is not self.root]
+        expanded.sort(key=lambda node: (node.visits, -node.depth))
+        if self.table is None:
+            for node in expanded:
+                if self.tree_size <= self.max_nodes // 2:
+                    break
+                removed = node.size - 1
+                self.tree_size -= removed
+                node.children = []
+                node.untried = None
+                while node is not None:
+                    node.size -= removed
+                    node = node.parent
+            return
+        i = 0
+        while self.tree_size > self.max_nodes // 2 and i < len(expanded):
+            size = self.tree_size
+            while size > self.max_nodes // 2 and i < len(expanded):
+                node = expanded[i]
+                i += 1
+                size -= count_nodes(node) - 1
+                node.children = []
+                node.child_actions = None
+                node.untried = None
+            self.tree_size = count_nodes(self.root)
+        if self.table is not None:
+            self.table = [None] * self.table_size
+
+    def select(self, node):
+        """Return the child of node chosen by the tree policy.
+
+        When nodes are proven, the policy chooses among the children from
+        open_children, so that no simulations go to lines already decided.
+        """
+        children = node.children
+        if self.solver or self.exact is not None:
+            children = self.open_children(node)
+        if children is node.children:
+            child = self.tree_policy(node)
+        else:
+            view = copy.copy(node)
+            view.children = children
+            child = self.tree_policy(view)
+        if self.table is not None:
+            self.reach(node, child)
+        return child
+
+    def open_children(self, node):
+        """Return the unproven children of node, or its best proven children if all are proven."""
+        unproven = [child for child in node.children if child.proven is None]
+        if len(unproven) == len(node.children):
+            return node.children
+        if unproven:
+            return unproven
+        turn = node.env.turn
+        best = max(exact_value(child)[turn] for child in node.children)
+        return [child for child in node.children if exact_value(child)[turn] == best]
+
+    def reach(self, node, child):
+        """Make node the parent of child, shared through the table, with the action of their edge.
+
+        A shared node is backed up along the path it was reached by, and
+        each parent keeps the actions of its edges in child_actions.
+        """
+        child.parent = node
+        child.action = node.child_actions[node.children.index(child)]
+
+    def edge_actions(self, node):
+        """Return the actions leading from node to each of its children."""
+        if self.table is None:
+            return [child.action for child in node.children]
+        return node.child_actions or []
+
+    def add_child(self, node, action):
+        """Add and return a child of node for action."""
+        env = node.env.copy()
+        _, reward, _, _ = env.step(action)
+        if self.table is None:
+            child = self.node_type(node, action, reward, env)
+            self.nodes_added += 1
+            self.tree_size += 1
+            while node is not None:
+                node.size += 1
+                node = node.parent
+            node = child.parent
+        else:
+            child = self.lookup(node, action, reward, env)
+            if node.child_actions is None:
+                node.child_actions = []
+            node.child_actions.append(action)
+            child.parent = node
+            child.action = action
+        if self.exact is not None and child.proven is None:
+            child.proven = self.exact(env)
+        node.children.append(child)
+        return child
+
+    def order_actions(self, env):
+        """Return the actions of env in the reverse of the order they should be tried."""
+        actions = list(env.actions)
+        if self.action_order == 'random':
+            random.shuffle(actions)
+        elif self.action_order == 'priority':
+            order = list(zip(env.priorities, actions))
+            random.shuffle(order)
+            order.sort(key=lambda pair: pair[0])
+            actions = [action for _, action in order]
+        else:
+            actions.sort(key=lambda action: self.action_order(env, action), reverse=True)
+            actions.reverse()
+        return actions
+
+    def lookup(self, parent, action, reward, env):
+        """Return the node for env as a child of parent from the transposition table.
+
+        A new node is created and stored in the table if none is found.
+        """
+        slot = env.hash % self.table_size
+        entry = self.table[slot]
+        if entry is not None and entry[0] == env.hash and entry[1].depth == parent.depth + 1:
+            return entry[1]
+        node = self.node_type(parent, action, reward, env)
+        self.nodes_added += 1
+        self.tree_size += 1
+        self.table[slot] = (env.hash, node)
         return node
 
     def simulate(self, node):
-        """Return one total reward from node following uniform random policy."""
+        """Return one total reward from node following the rollout policy.
+
+        The proven value of a proven node is returned instead. The players
+        and actions of the game are kept in rollout_actions when AMAF
+        statistics are kept.
+        """
+        self.rollout_actions = []
+        if node.proven is not None:
+            return node.proven.copy()
+        if self.rollout_policy != 'python':
+            return node.env.playout(random.getrandbits(64), self.rollout_policy == 'heavy')
         env = node.env.copy()
         total_rewards = np.zeros(env.players)
         while not env.done:
             action = random.choice(env.actions)
+            if self.amaf:
+                self.rollout_actions.append((env.turn, action))
             _, rewards, _, _ = env.step(action)
             total_rewards += rewards
         return total_rewards
 
     def backup(self, node, value):
         """Backup the return from a rollout from node."""
+        if self.amaf:
+            self.backup_amaf(node, value)
+        if self.zero_sum:
+            total = float(value[0])
+            while node is not None:
+                total += node.reward
+                node.visits += 1
+                node.value += (node.sign * total - node.value) / node.visits
+                node = node.parent
+            return
         while node is not None:
             value += node.reward
             node.visits += 1
             node.value = (node.visits - 1)/node.visits * node.value + value/node.visits
             node = node.parent
 
+    def backup_amaf(self, node, value):
+        """Update the AMAF statistics of the children of each node on the path to node.
+
+        A child is updated when the player to move at its parent made its
+        action later in the simulation, in the tree or in the rollout.
+        """
+        played = set(self.rollout_actions)
+        while node is not None:
+            turn = node.env.turn
+            for child, action in zip(node.children, self.edge_actions(node)):
+                if (turn, action) in played:
+                    child.amaf_visits += 1
+                    child.amaf_value += (value[turn] - child.amaf_value) / child.amaf_visits
+            if node.parent is not None:
+                played.add((node.parent.env.turn, node.action))
+            value = value + node_rewards(node)
+            node = node.parent
+
     def find_root(self, env):
-        """Return node corresponding to env in current tree using BFS."""
-        if self.root is not None:
-            q = deque(self.root.children)
-            while q:
-                node = q.popleft()
-                if node.env == env:
+        """Return node corresponding to env in current tree.
+
+        The tree is followed from the node of the last chosen action through
+        the next action played, so that the search continues from what is
+        already known about env. The rest of the tree is dropped. A new root
+        is returned if env is not reached.
+        """
+        if self.chosen is not None:
+            for node in [self.chosen] + self.chosen.children:
+                if same_position(node.env, env):
+                    self.reroot(node)
                     return node
-                q.extend(node.children)
-        return TreeNode(None, None, np.zeros(env.players), env)
+        self.tree_size = 1
+        root = self.node_type(None, None, np.zeros(env.players), env)
+        if self.exact is not None:
+            root.proven = self.exact(env)
+        return root
+
+    def reroot(self, node):
+        """Make node the root of the tree and drop the rest.
+
+        Without a transposition table the kept size is that of the subtree
+        of node. With one, nodes are shared, so when max_nodes is given the
+        kept nodes are counted and the table entries for dropped nodes are
+        removed, so that no dropped node is attached again through it.
+        """
+        node.parent = None
+        if self.table is None:
+            self.tree_size = node.size
+        elif self.max_nodes is not None:
+            kept = {id(kept) for kept in walk(node)}
+            self.tree_size = len(kept)
+            self.table = [entry if entry is not None and id(entry[1]) in kept else None
+                          for entry in self.table]
+
+
+def same_position(env1, env2):
+    """Return whether two envs have the same position and player to move."""
+    if hasattr(env1, 'hash'):
+        return env1.hash == env2.hash
+    return env1.turn == env2.turn and np.array_equal(env1.board, env2.board)
+
+
+def node_rewards(node):
+    """Return the rewards of the players for the action leading to node."""
+    if isinstance(node, ZeroSumTreeNode):
+        return np.array([node.reward, -node.reward])
+    return node.reward
+
+
+def exact_value(node):
+    """Return the proven return of the players from the action leading to node."""
+    return node_rewards(node) + node.proven
+
+
+def walk(node):
+    """Yield each node reachable from node once, including node."""
+    seen = {id(node)}
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        for child in node.children:
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+
+
+def count_nodes(node):
+    """Return the number of nodes reachable from node, including node."""
+    return sum(1 for _ in walk(node))
+
+
+class ArrayTree:
+    """A search tree stored as a structure of arrays indexed by node id.
+
+    Node ``i`` has ``visits[i]``, per-player ``value[i]`` and ``reward[i]``,
+    the id ``parent[i]`` of its parent (-1 for the root) and the index
+    ``action[i]`` of the action leading to it in its parent's action list.
+    Children are allocated together, so the children of node ``i`` are the
+    ids ``first_child[i]`` to ``first_child[i] + num_children[i] - 1``. The
+    arrays double in size when full.
+
+    Parameters
+    ----------
+    players : int
+        The number of players in the game.
+    capacity : int, optional
+        The number of nodes to allocate space for initially.
+
+    """
+
+    _arrays = ('visits', 'value', 'reward', 'parent', 'first_child', 'num_children', 'action')
+
+    def __init__(self, players, capacity=1024):
+        self.size = 0
+        self.envs = []
+        self.visits = np.zeros(capacity, dtype=np.int64)
+        self.value = np.zeros((capacity, players))
+        self.reward = np.zeros((capacity, players))
+        self.parent = np.zeros(capacity, dtype=np.int64)
+        self.first_child = np.zeros(capacity, dtype=np.int64)
+        self.num_children = np.zeros(capacity, dtype=np.int64)
+        self.action = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """The number of bytes allocated for node statistics."""
+        return sum(getattr(self, name).nbytes for name in self._arrays)
+
+    def add(self, parent, rewards, envs):
+        """Add nodes for envs as children of parent and return the first id.
+
+        The new nodes take the actions in the order of the parent's action
+        list. A parent of -1 adds a root node.
+        """
+        n = len(envs)
+        first = self.size
+        if first + n > len(self.visits):
+            self._grow(first + n)
+        self.size += n
+        self.envs.extend(envs)
+        ids = slice(first, first + n)
+        self.visits[ids] = 0
+        self.value[ids] = 0
+        self.reward[ids] = rewards
+        self.parent[ids] = parent
+        self.num_children[ids] = 0
+        self.action[ids] = np.arange(n)
+        if parent >= 0:
+            self.first_child[parent] = first
+            self.num_children[parent] = n
+        return first
+
+    def children(self, node):
+        """Return the range of child ids of node."""
+        first = self.first_child[node]
+        return range(first, first + self.num_children[node])
+
+    def node(self, node):
+        """Return an ArrayTreeNode snapshot of node and its children."""
+        ids = self.children(node)
+        visits = self.visits[ids.start:ids.stop].tolist()
+        values = self.value[ids.start:ids.stop].tolist()
+        children = [ArrayTreeNode(i, self.envs[i], n, v) for i, n, v in zip(ids, visits, values)]
+        return ArrayTreeNode(node, self.envs[node], int(self.visits[node]),
+                             self.value[node].tolist(), children)
+
+    def _grow(self, size):
+        """Reallocate the arrays to hold at least size nodes."""
+        capacity = max(size, 2 * len(self.visits))
+        for name in self._arrays:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+
+class ArrayTreeNode:
+    """A snapshot of one node of an ArrayTree with the TreeNode attributes.
+
+    This lets tree policies written for TreeNode without a select method
+    choose children in an ArrayTree. Statistics are copied out as Python
+    numbers when the snapshot is taken.
+    """
+
+    __slots__ = ('id', 'env', 'visits', 'value', 'children')
+
+    def __init__(self, id, env, visits, value, children=()):
+        self.id = id
+        self.env = env
+        self.visits = visits
+        self.value = value
+        self.children = children
+
+
+class ArrayMCTSAgent(MCTSAgent):
+    """A Monte Carlo tree search agent with an array-backed search tree.
+
+    This agent performs the same search as MCTSAgent, but keeps node
+    statistics in an ArrayTree instead of TreeNode objects. Expansion adds
+    all children of a node with a few array writes and backup updates the
+    whole selected path at once.
+
+    Parameters
+    ----------
+    tree_policy : function
+        A function which maps node to child node. Policies with a select
+        method, such as ucb and epsilon_greedy, score the contiguous child
+        statistics directly.
+    timeout : float, optional
+        The amount of time in seconds to perform rollouts before choosing an
+        action, or None for no time limit.
+    iterations : int, optional
+        If given, the number of simulations to perform before choosing an action.
+    nodes : int, optional
+        If given, the number of nodes to add to the tree before choosing an action.
+    capacity : int, optional
+        The number of nodes to allocate space for initially.
+
+    """
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, iterations=None, nodes=None, capacity=1024):
+        super().__init__(tree_policy=tree_policy, timeout=timeout, iterations=iterations, nodes=nodes)
+        self.capacity = capacity
+        self.tree = None
+
+    def act(self, env):
+        """Return a chosen action for the env.
+
+        Parameters
+        ----------
+        env : environment
+            The current environment.
+
+        """
+        self.tree = ArrayTree(env.players, self.capacity)
+        self.tree.add(-1, np.zeros((1, env.players)), [env])
+        self.simulations = 0
+        self.nodes_added = 0
+        start = time.perf_counter()
+        batch = self.batch_size(start)
+        while batch > 0:
+            for _ in range(batch):
+                path = self.expand(0)
+                value = self.simulate(path[-1])
+                self.backup(path, value)
+            self.simulations += batch
+            self.nodes_added = len(self.tree) - 1
+            batch = self.batch_size(start)
+        children = self.tree.children(0)
+        best = children[np.argmax(self.tree.visits[children.start:children.stop])]
+        return env.actions[self.tree.action[best]]
+
+    def expand(self, node):
+        """Return the path of ids from node to an unvisited or terminal leaf.
+
+        Before returning, this function performs all possible actions from the
+        leaf node and adds new nodes for them to the tree as children of the
+        leaf node.
+        """
+        tree = self.tree
+        select = getattr(self.tree_policy, 'select', None)
+        path = [node]
+        while tree.visits[node] != 0 and tree.num_children[node] > 0:
+            if select is None:
+                node = self.tree_policy(tree.node(node)).id
+            else:
+                first = tree.first_child[node]
+                last = first + tree.num_children[node]
+                turn = tree.envs[node].turn
+                node = first + select(tree.visits[first:last], tree.value[first:last, turn],
+                                      tree.visits[node])
+            path.append(node)
+        leaf = tree.envs[node]
+        if not leaf.done:
+            actions = leaf.actions
+            envs = []
+            rewards = np.empty((len(actions), leaf.players))
+            for i, action in enumerate(actions):
+                env = leaf.copy()
+                _, rewards[i], _, _ = env.step(action)
+                envs.append(env)
+            tree.add(node, rewards, envs)
+        return path
+
+    def simulate(self, node):
+        """Return one total reward from node following uniform random policy."""
+        env = self.tree.envs[node].copy()
+        total_rewards = np.zeros(env.players)
+        while not env.done:
+            action = random.choice(env.actions)
+            _, rewards, _, _ = env.step(action)
+            total_rewards += rewards
+        return total_rewards
+
+    def backup(self, path, value):
+        """Backup the return from a rollout along the path of node ids."""
+        tree = self.tree
+        path = np.array(path[::-1])
+        returns = value + np.cumsum(tree.reward[path], axis=0)
+        tree.visits[path] += 1
+        tree.value[path] += (returns - tree.value[path]) / tree.visits[path, None]
+
+
+class LeafParallelMCTSAgent(MCTSAgent):
+    """A Monte Carlo tree search agent that plays out several games per leaf.
+
+    Each simulation runs a batch of uniform random games from the selected
+    leaf in one native rollout call and backs up all of them at once, as if
+    they had been separate simulations through the same leaf. This requires
+    envs with a native rollout method, such as the Cython envs.
+
+    Parameters
+    ----------
+    tree_policy : function
+        A function which maps node to child node.
+    timeout : float, optional
+        The amount of time in seconds to perform rollouts before choosing an action.
+    playouts : int, optional
+        The number of games played out from each leaf.
+
+    Other keyword arguments are passed to MCTSAgent, where a rollout_policy
+    of 'heavy' selects the heavy playout policy for the games.
+
+    """
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, playouts=16, **kwargs):
+        if isinstance(tree_policy, RAVEPolicy):
+            raise ValueError('AMAF statistics are not kept for batches of playouts')
+        super().__init__(tree_policy=tree_policy, timeout=timeout, **kwargs)
+        self.playouts = playouts
+
+    def simulate(self, node):
+        """Return the summed total rewards of a batch of random games from node.
+
+        The proven value of a proven node is counted for each game instead.
+        """
+        if node.proven is not None:
+            return self.playouts * node.proven
+        rewards = node.env.rollout(self.playouts, random.getrandbits(64), self.rollout_policy == 'heavy')
+        return rewards.sum(axis=0, dtype=np.float64)
+
+    def decided(self, remaining):
+        """Return whether remaining batches of playouts cannot change the most visited child."""
+        return super().decided(remaining * self.playouts)
+
+    def backup(self, node, value):
+        """Backup the summed returns from a batch of rollouts from node."""
+        if self.zero_sum:
+            total = float(value[0])
+            while node is not None:
+                total += self.playouts * node.reward
+                node.visits += self.playouts
+                node.value += (node.sign * total - self.playouts * node.value) / node.visits
+                node = node.parent
+            return
+        while node is not None:
+            value += self.playouts * node.reward
+            node.visits += self.playouts
+            node.value = node.value + (value - self.playouts * node.value) / node.visits
+            node = node.parent
+
+
+class RootParallelMCTSAgent(MCTSAgent):
+    """A Monte Carlo tree search agent that searches in a pool of processes.
+
+    Each worker process runs an independent MCTSAgent search of the same
+    position for the timeout. The root child visit counts and values of all
+    searches are merged before choosing the action with the most visits. The
+    worker processes are started on the first call to act and reused for
+    later moves and games until close is called.
+
+    Parameters
+    ----------
+    tree_policy : function
+        A function which maps node to child node.
+    timeout : float, optional
+        The amount of time in seconds to perform rollouts before choosing an action.
+    workers : int, optional
+        The number of worker processes, by default the number of CPUs.
+
+    """
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, workers=None):
+        super().__init__(tree_policy=tree_policy, timeout=timeout)
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.simulations = 0
+        self.stats = {}
+
+    def act(self, env):
+        """Return a chosen action for the env.
+
+        Parameters
+        ----------
+        env : environment
+            The current environment.
+
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, initializer=random.seed)
+        tasks = [(self.tree_policy, self.timeout, env)] * self.workers
+        self.simulations = 0
+        self.stats = {}
+        for simulations, children in self.pool.map(_root_search, tasks, chunksize=1):
+            self.simulations += simulations
+            for action, visits, value in children:
+                total_visits, total_value = self.stats.get(action, (0, 0.0))
+                self.stats[action] = (total_visits + visits, total_value + visits * value)
+        self.stats = {action: (visits, value / visits if visits > 0 else 0.0)
+                      for action, (visits, value) in self.stats.items()}
+        return max(self.stats, key=lambda action: self.stats[action][0])
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def _root_search(task):
+    """Return the simulations and root child statistics of one search in a worker."""
+    tree_policy, timeout, env = task
+    agent = MCTSAgent(tree_policy=tree_policy, timeout=timeout)
+    agent.act(env)
+    turn = env.turn
+    children = [(child.action, child.visits, child.value[turn]) for child in agent.root.children]
+    return agent.root.visits, children
+
+
+class NativeMCTSAgent(MCTSAgent):
+    """A Monte Carlo tree search agent that runs the whole search in C++.
+
+    Selection, expansion, random playouts and backup follow MCTSAgent but are
+    performed by the native search of the Cython envs without holding the
+    GIL. The tree is discarded after each move. The statistics of the root
+    children are kept in stats, mapping action to visits and mean value for
+    the player to move.
+
+    Parameters
+    ----------
+    tree_policy : function
+        A UCBPolicy or EpsilonGreedyPolicy, whose parameter is passed to the
+        native search.
+    timeout : float, optional
+        The amount of time in seconds to perform rollouts before choosing an
+        action, or None for no time limit.
+    iterations : int, optional
+        If given, the number of simulations to perform before choosing an action.
+    nodes : int, optional
+        If given, the number of nodes to add to the tree before choosing an action.
+    rollout_policy : str, optional
+        The native playout policy, 'random' or 'heavy'.
+    book : OpeningBook, optional
+        If given, an opening book consulted before searching, as for MCTSAgent.
+
+    """
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, iterations=None, nodes=None,
+                 rollout_policy='random', book=None):
+        super().__init__(tree_policy=tree_policy, timeout=timeout, iterations=iterations,
+                         nodes=nodes, rollout_policy=rollout_policy, book=book)
+        if isinstance(tree_policy, UCBPolicy):
+            self.policy, self.param = 0, tree_policy.c
+        elif isinstance(tree_policy, EpsilonGreedyPolicy):
+            self.policy, self.param = 1, tree_policy.epsilon
+        else:
+            raise ValueError('tree policy not supported by the native search')
+        self.stats = {}
+
+    def act(self, env):
+        """Return a chosen action for the env.
+
+        Parameters
+        ----------
+        env : environment
+            The current environment.
+
+        """
+        action = self.book_move(env)
+        if action is not None:
+            self.stats = {}
+            return action
+        actions, visits, values, self.simulations, self.nodes_added = env.search(
+            self.policy, self.param, self.timeout, self.iterations, self.nodes,
+            random.getrandbits(64), self.rollout_policy == 'heavy')
+        turn = env.turn
+        self.stats = {action: (int(n), float(value[turn]))
+                      for action, n, value in zip(actions, visits, values)}
+        return actions[int(visits.argmax())]
+
+
+class TreeParallelMCTSAgent(NativeMCTSAgent):
+    """A Monte Carlo tree search agent that searches one tree from several threads.
+
+    The whole search runs in the native parallel search of the Cython envs
+    without holding the GIL or any lock during simulations. Visits and
+    values are updated atomically, and until its result is backed up, each
+    node on a selected path carries a virtual loss for the player who chose
+    it, which steers the other threads to different branches. A leaf is
+    expanded by the first thread to reach it. As for NativeMCTSAgent, the
+    tree is discarded after each move and the statistics of the root
+    children are kept in stats.
+
+    Parameters
+    ----------
+    tree_policy : function
+        A UCBPolicy or EpsilonGreedyPolicy, whose parameter is passed to the
+        native search.
+    timeout : float, optional
+        The amount of time in seconds to perform rollouts before choosing an
+        action, or None for no time limit.
+    threads : int, optional
+        The number of search threads, by default the number of CPUs.
+    virtual_loss : float, optional
+        The reward counted against the player choosing a node while a
+        simulation through it is in progress.
+    rollout_policy : str, optional
+        The native playout policy, 'random' or 'heavy'.
+
+    Other keyword arguments are passed to NativeMCTSAgent.
+
+    """
+
+    def __init__(self, tree_policy=ucb(), timeout=1.0, threads=None, virtual_loss=1.0,
+                 rollout_policy='random', **kwargs):
+        super().__init__(tree_policy=tree_policy, timeout=timeout, rollout_policy=rollout_policy,
+                         **kwargs)
+        self.threads = threads or os.cpu_count()
+        self.virtual_loss = virtual_loss
+
+    def act(self, env):
+        """Return a chosen action for the env.
+
+        Parameters
+        ----------
+        env : environment
+            The current environment.
+
+        """
+        action = self.book_move(env)
+        if action is not None:
+            self.stats = {}
+            return action
+        actions, visits, values, self.simulations, self.nodes_added = env.parallel_search(
+            self.policy, self.param, self.timeout, self.iterations, self.nodes,
+            random.getrandbits(64), self.rollout_policy == 'heavy', self.threads, self.virtual_loss)
+        turn = env.turn
+        self.stats = {action: (int(n), float(value[turn]))
+                      for action, n, value in zip(actions, visits, values)}
+        return actions[int(visits.argmax())]
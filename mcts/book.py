@@ -0,0 +1,164 @@
+"""Opening books of move statistics from deep searches, read through mmap."""
+
+import mmap
+
+import numpy as np
+
+from .agents import child_stats
+
+
+MAGIC = b'MCTSBOOK'
+
+HEADER_SIZE = 16
+
+ENTRY = np.dtype([('action', '<u2'), ('visits', '<u4'), ('value', '<f4')])
+
+
+class OpeningBook:
+    """An opening book file mapped into memory.
+
+    The file holds a 16 byte header, the magic bytes and the number of
+    entries, followed by the sorted position hashes of the entries and then
+    the entries in the same order. Each entry gives the index of an action
+    in env.actions and the visits and mean value for the player to move of
+    the root child for it in the search of the position. Opening the book
+    maps the file without reading it, and a lookup binary searches the
+    hashes, so only the pages it touches are read. This requires envs with
+    a hash property, such as the Cython envs.
+
+    Parameters
+    ----------
+    path : str
+        The path of the book file, as written by write_book.
+
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.mmap) < HEADER_SIZE or self.mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path!r} is not an opening book')
+            count = int(np.frombuffer(self.mmap, dtype='<u8', count=1, offset=len(MAGIC))[0])
+            size = HEADER_SIZE + (8 + ENTRY.itemsize) * count
+            if len(self.mmap) != size:
+                raise ValueError(f'{path!r} holds {len(self.mmap)} bytes, '
+                                 f'not the {size} bytes of a book of {count} entries')
+            self.hashes = np.frombuffer(self.mmap, dtype='<u8', count=count, offset=HEADER_SIZE)
+            self.entries = np.frombuffer(self.mmap, dtype=ENTRY, count=count,
+                                         offset=HEADER_SIZE + 8 * count)
+        except Exception:
+            self.hashes = self.entries = None
+            self.mmap.close()
+            raise
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.entries)
+
+    def lookup(self, env):
+        """Return a list of (action, visits, value) for env, empty if it is not in the book."""
+        key = np.uint64(env.hash)
+        start = np.searchsorted(self.hashes, key, side='left')
+        stop = np.searchsorted(self.hashes, key, side='right')
+        actions = env.actions
+        return [(actions[entry['action']], int(entry['visits']), float(entry['value']))
+                for entry in self.entries[start:stop] if entry['action'] < len(actions)]
+
+    def move(self, env):
+        """Return the action with the most visits in the book for env, or None."""
+        stats = self.lookup(env)
+        if not stats:
+            return None
+        return max(stats, key=lambda stat: stat[1])[0]
+
+    def close(self):
+        """Unmap the file."""
+        self.hashes = self.entries = None
+        self.mmap.close()
+
+
+def write_book(path, stats):
+    """Write an opening book file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the book file.
+    stats : iterable
+        Tuples (hash, action index, visits, value) of the entries.
+
+    """
+    stats = list(stats)
+    hashes = np.array([stat[0] for stat in stats], dtype='<u8')
+    entries = np.array([stat[1:] for stat in stats], dtype=ENTRY)
+    order = np.argsort(hashes, kind='stable')
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([len(stats)], dtype='<u8').tobytes())
+        f.write(hashes[order].tobytes())
+        f.write(entries[order].tobytes())
+
+
+def search_stats(agent, env):
+    """Return the action chosen by agent for env and the visits and values of all actions.
+
+    Statistics are read from the stats of agents that keep them, such as
+    NativeMCTSAgent, and from the root children otherwise.
+    """
+    action = agent.act(env)
+    if hasattr(agent, 'stats'):
+        stats = agent.stats
+    else:
+        visits, values = child_stats(agent.root)
+        actions = agent.edge_actions(agent.root)
+        stats = {action: (int(n), float(value))
+                 for action, n, value in zip(actions, visits, values)}
+    return action, stats
+
+
+def build_book(path, env, agent, depth, width=None):
+    """Search the positions of the first moves of games and write an opening book.
+
+    Parameters
+    ----------
+    path : str
+        The path of the book file.
+    env : environment
+        An env with a hash property, which is reset to the initial position.
+    agent : agent
+        The agent whose search statistics are stored, with a long timeout
+        or many iterations.
+    depth : int
+        The number of moves from the initial position to include.
+    width : int, optional
+        If given, only the width actions with the most visits are followed
+        from each position, else all actions.
+
+    Returns
+    -------
+    int
+        The number of positions searched.
+
+    """
+    env.reset()
+    stats, seen = [], set()
+    frontier = [env.copy()]
+    for _ in range(depth):
+        following = []
+        for position in frontier:
+            if position.done or position.hash in seen:
+                continue
+            seen.add(position.hash)
+            _, children = search_stats(agent, position)
+            index = {action: i for i, action in enumerate(position.actions)}
+            for action, (visits, value) in children.items():
+                stats.append((position.hash, index[action], visits, value))
+            followed = sorted(children, key=lambda action: children[action][0], reverse=True)
+            for action in followed[:width]:
+                child = position.copy()
+                child.step(action)
+                following.append(child)
+        frontier = following
+    write_book(path, stats)
+    return len(seen)
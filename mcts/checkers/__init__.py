@@ -1 +1,2 @@
 from .checkers import PyCheckersEnv, CCheckersEnv, CheckersApp, CheckersGUI
+from .wrapped import VecCheckersEnv
@@ -1,160 +1,260 @@
 #include "checkers.h"
 
-CheckersEnv::CheckersEnv() {
-  turn = 0;
-  actions.clear();
-  actions.push_back(std::make_pair(std::make_pair(2, 1), std::make_pair(3, 0)));
-  actions.push_back(std::make_pair(std::make_pair(2, 1), std::make_pair(3, 2)));
-  actions.push_back(std::make_pair(std::make_pair(2, 3), std::make_pair(3, 2)));
-  actions.push_back(std::make_pair(std::make_pair(2, 3), std::make_pair(3, 4)));
-  actions.push_back(std::make_pair(std::make_pair(2, 5), std::make_pair(3, 4)));
-  actions.push_back(std::make_pair(std::make_pair(2, 5), std::make_pair(3, 6)));
-  actions.push_back(std::make_pair(std::make_pair(2, 7), std::make_pair(3, 6)));
-  for (int i=0; i < 8; i++)
-  {
-      for (int j=0; j < 8; j++)
-      {
-          board[8*i+j]=0;
-          if ((i+j)%2!=0)
-          {
-              if (i<3)
-              {
-                  board[8*i+j]=1;
-              }
-              if (i>4)
-              {
-                  board[8*i+j]=-1;
-              }
-          }
-      }
+// The squares of the even and odd rows and of the first and last dark
+// square of each row.
+static const unsigned int EVEN_ROWS = 0x0F0F0F0FU;
+static const unsigned int ODD_ROWS = 0xF0F0F0F0U;
+static const unsigned int FIRST = 0x11111111U;
+static const unsigned int LAST = 0x88888888U;
+
+// The squares where men of each player are promoted.
+static const unsigned int PROMOTION[2] = {0xF0000000U, 0x0000000FU};
+
+// Return the squares one step up-left, up-right, down-left and down-right of
+// the squares in m, where up is towards row 0. Steps off the board are dropped.
+static inline unsigned int up_left(unsigned int m) {
+  return ((m & EVEN_ROWS) >> 4) | ((m & ODD_ROWS & ~FIRST) >> 5);
+}
+
+static inline unsigned int up_right(unsigned int m) {
+  return ((m & EVEN_ROWS & ~LAST) >> 3) | ((m & ODD_ROWS) >> 4);
+}
+
+static inline unsigned int down_left(unsigned int m) {
+  return ((m & EVEN_ROWS) << 4) | ((m & ODD_ROWS & ~FIRST) << 3);
+}
+
+static inline unsigned int down_right(unsigned int m) {
+  return ((m & EVEN_ROWS & ~LAST) << 5) | ((m & ODD_ROWS) << 4);
+}
+
+// Return the squares one step in direction d of the squares in m, with the
+// directions up-left, up-right, down-left and down-right in the order in
+// which moves are listed.
+static inline unsigned int shift(int d, unsigned int m) {
+  switch (d) {
+  case 0: return up_left(m);
+  case 1: return up_right(m);
+  case 2: return down_left(m);
+  default: return down_right(m);
   }
-  done = false;
+}
+
+// Return the squares one step opposite to direction d of the squares in m.
+static inline unsigned int shift_back(int d, unsigned int m) {
+  return shift(3 - d, m);
+}
+
+static inline int row(int square) {
+  return square >> 2;
+}
+
+static inline int col(int square) {
+  return 2 * (square & 3) + 1 - (row(square) & 1);
+}
+
+// Return the index of the lowest set bit of a nonzero mask.
+static inline int lowest(unsigned int m) {
+  return __builtin_ctz(m);
+}
+
+// Return the Zobrist key of the piece of a player on a square, keyed by the
+// 64-square index and by the piece index of a man (1, -1) or king (2, -2).
+static inline unsigned long long piece_key(int square, int player, bool king) {
+  return zobrist(8 * row(square) + col(square), 2 * player + king);
+}
+
+// Return whether the player owning own, with other the pieces of the
+// opponent, has a simple move or a jump.
+static bool has_moves(unsigned int own, unsigned int other, unsigned int kings, int player) {
+  unsigned int empty = ~(own | other);
+  for (int d = 0; d < 4; d++) {
+    unsigned int movers = (d < 2) == (player == 0) ? own & kings : own;
+    if (movers & (shift_back(d, empty) | shift_back(d, other & shift_back(d, empty))))
+      return true;
+  }
+  return false;
+}
+
+CheckersEnv::CheckersEnv() {
+  reset();
 }
 
 void CheckersEnv::reset() {
   turn = 0;
-  actions.clear();
-  actions.push_back(std::make_pair(std::make_pair(2, 1), std::make_pair(3, 0)));
-  actions.push_back(std::make_pair(std::make_pair(2, 1), std::make_pair(3, 2)));
-  actions.push_back(std::make_pair(std::make_pair(2, 3), std::make_pair(3, 2)));
-  actions.push_back(std::make_pair(std::make_pair(2, 3), std::make_pair(3, 4)));
-  actions.push_back(std::make_pair(std::make_pair(2, 5), std::make_pair(3, 4)));
-  actions.push_back(std::make_pair(std::make_pair(2, 5), std::make_pair(3, 6)));
-  actions.push_back(std::make_pair(std::make_pair(2, 7), std::make_pair(3, 6)));
-  for (int i=0; i < 8; i++)
-  {
-      for (int j=0; j < 8; j++)
-      {
-          board[8*i+j]=0;
-          if ((i+j)%2!=0)
-          {
-              if (i<3)
-              {
-                  board[8*i+j]=1;
-              }
-              if (i>4)
-              {
-                  board[8*i+j]=-1;
-              }
-          }
+  pieces[0] = 0x00000FFFU;
+  pieces[1] = 0xFFF00000U;
+  kings = 0;
+  done = false;
+  hash = 0;
+  for (int p = 0; p < 2; p++)
+    for (unsigned int m = pieces[p]; m; m &= m - 1)
+      hash ^= piece_key(lowest(m), p, false);
+  find_actions();
+}
+
+// Fill the action list of the player to move from the bitboards, listing
+// the moves of each piece in square order, simple moves before jumps and
+// each in the order of the directions of shift.
+void CheckersEnv::find_actions() {
+  unsigned int own = pieces[turn], empty = ~(pieces[0] | pieces[1]);
+  // men of the first player move down the board and those of the second up
+  unsigned int movers[4];
+  movers[0] = movers[1] = turn == 0 ? own & kings : own;
+  movers[2] = movers[3] = turn == 0 ? own : own & kings;
+  unsigned int steps[4], jumps[4], any = 0;
+  for (int d = 0; d < 4; d++) {
+    steps[d] = movers[d] & shift_back(d, empty);
+    jumps[d] = movers[d] & shift_back(d, pieces[1 - turn] & shift_back(d, empty));
+    any |= steps[d] | jumps[d];
+  }
+  num_actions = 0;
+  for (unsigned int m = any; m; m &= m - 1) {
+    int from = lowest(m);
+    unsigned int bit = 1U << from;
+    for (int d = 0; d < 4; d++)
+      if (steps[d] & bit) {
+        action_from[num_actions] = from;
+        action_to[num_actions++] = lowest(shift(d, bit));
+      }
+    for (int d = 0; d < 4; d++)
+      if (jumps[d] & bit) {
+        action_from[num_actions] = from;
+        action_to[num_actions++] = lowest(shift(d, shift(d, bit)));
       }
   }
-  done = false;
 }
 
 std::pair<float, float> CheckersEnv::step(int i1, int j1, int i2, int j2) {
-    if ((i1 - i2 == 2)||(i2 - i1 == 2))
-    {
-        board[8*((i1+i2)/2)+((j1+j2)/2)]=0;
-    }
-    board[8*i2+j2]=board[8*i1+j1];
-    if ((i2 == 0)||(i2 == 7))
-    {
-        if ((board[8*i1+j1] == 1)||(board[8*i1+j1] == -1))
-        {
-            board[8*i2+j2]=2*board[8*i1+j1];
-        }
-    }
-    board[8*i1+j1] = 0;
-    turn = (turn + 1) % 2;
-    actions.clear();
-    int token = (turn == 0 ? 1 : -1);
-    for(int i=0; i < 8; i++)
-    {
-        for(int j=0; j < 8; j++)
-        {
-            if ((board[8*i+j] == token)||(board[8*i+j]==2*token))
-            {
-                if ((i>0)&&(j>0)&&(board[8*i+j]!=1))
-                {
-                    if(board[8*(i-1)+(j-1)]==0)
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i-1, j-1)));
-                    }
-                }
-                if ((i>0)&&(j<7)&&(board[8*i+j]!=1))
-                {
-                    if(board[8*(i-1)+(j+1)]==0)
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i-1, j+1)));
-                    }
-                }
-                if ((i<7)&&(j>0)&&(board[8*i+j]!=-1))
-                {
-                    if(board[8*(i+1)+(j-1)]==0)
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i+1, j-1)));
-                    }
-                }
-                if ((i<7)&&(j<7)&&(board[8*i+j]!=-1))
-                {
-                    if(board[8*(i+1)+(j+1)]==0)
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i+1, j+1)));
-                    }
-                }
-                if ((i>1)&&(j>1)&&(board[8*i+j]!=1))
-                {
-                    if ((board[8*(i-2)+(j-2)]==0)&&(board[8*(i-1)+(j-1)]*board[8*i+j]<0))
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i-2, j-2)));
-                    }
-                }
-                if ((i>1)&&(j<6)&&(board[8*i+j]!=1))
-                {
-                    if ((board[8*(i-2)+(j+2)]==0)&&(board[8*(i-1)+(j+1)]*board[8*i+j]<0))
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i-2, j+2)));
-                    }
-                }
-                if ((i<6)&&(j>1)&&(board[8*i+j]!=-1))
-                {
-                    if ((board[8*(i+2)+(j-2)]==0)&&(board[8*(i+1)+(j-1)]*board[8*i+j]<0))
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i+2, j-2)));
-                    }
-                }
-                if ((i<6)&&(j<6)&&(board[8*i+j]!=-1))
-                {
-                    if ((board[8*(i+2)+(j+2)]==0)&&(board[8*(i+1)+(j+1)]*board[8*i+j]<0))
-                    {
-                        actions.push_back(std::make_pair(std::make_pair(i, j), std::make_pair(i+2, j+2)));
-                    }
-                }
-            }
-        }
+  return move(4 * i1 + j1 / 2, 4 * i2 + j2 / 2);
+}
+
+// Move the piece on square from to square to, capturing the piece jumped
+// over if any, and return the rewards.
+std::pair<float, float> CheckersEnv::move(int from, int to) {
+  unsigned int from_bit = 1U << from, to_bit = 1U << to;
+  bool king = kings & from_bit;
+  if (row(from) - row(to) == 2 || row(to) - row(from) == 2) {
+    int captured = 4 * ((row(from) + row(to)) / 2) + (col(from) + col(to)) / 4;
+    unsigned int captured_bit = 1U << captured;
+    hash ^= piece_key(captured, 1 - turn, kings & captured_bit);
+    pieces[1 - turn] &= ~captured_bit;
+    kings &= ~captured_bit;
+  }
+  hash ^= piece_key(from, turn, king);
+  pieces[turn] = (pieces[turn] & ~from_bit) | to_bit;
+  kings &= ~from_bit;
+  if (king || (to_bit & PROMOTION[turn]))
+    kings |= to_bit;
+  hash ^= piece_key(to, turn, kings & to_bit);
+  turn = (turn + 1) % 2;
+  hash ^= ZOBRIST_TURN;
+  find_actions();
+  if (num_actions == 0) {
+    done = true;
+    if (turn == 0)
+      return std::make_pair(-1, 1);
+    else
+      return std::make_pair(1, -1);
+  }
+  return std::make_pair(0, 0);
+}
+
+// Write the legal moves as indices into the actions and return their number.
+int CheckersEnv::legal_moves(int* moves) const {
+  for (int i = 0; i < num_actions; i++)
+    moves[i] = i;
+  return num_actions;
+}
+
+std::pair<float, float> CheckersEnv::play(int move) {
+  return this->move(action_from[move], action_to[move]);
+}
+
+// Return an action as the row and column of the squares it moves from and to.
+std::pair<std::pair<int, int>, std::pair<int, int> > CheckersEnv::action(int move) const {
+  int from = action_from[move], to = action_to[move];
+  return std::make_pair(std::make_pair(row(from), col(from)), std::make_pair(row(to), col(to)));
+}
+
+// Return the move ordering priority of a move: 2 for a capture, plus 1 for a promotion.
+int CheckersEnv::priority(int move) const {
+  int from = action_from[move], to = action_to[move];
+  int p = 0;
+  if (row(from) - row(to) == 2 || row(to) - row(from) == 2)
+    p += 2;
+  if (!(kings & (1U << from)) && ((1U << to) & PROMOTION[turn]))
+    p += 1;
+  return p;
+}
+
+std::pair<float, float> CheckersEnv::playout(unsigned long long seed, bool heavy) const {
+  CheckersEnv env(*this);
+  XorShift rng(seed);
+  return env.play_random(rng, heavy);
+}
+
+void CheckersEnv::rollout(int k, unsigned long long seed, float* rewards, bool heavy) const {
+  XorShift rng(seed);
+  for (int i = 0; i < k; i++) {
+    CheckersEnv env(*this);
+    std::pair<float, float> reward = env.play_random(rng, heavy);
+    rewards[2 * i] = reward.first;
+    rewards[2 * i + 1] = reward.second;
+  }
+}
+
+std::pair<float, float> CheckersEnv::play_random(XorShift& rng, bool heavy) {
+  for (int i = 0; i < max_playout_moves && !done; i++) {
+    int move = heavy ? heavy_move(rng) : rng.below(num_actions);
+    std::pair<float, float> reward = play(move);
+    if (done)
+      return reward;
+  }
+  return std::make_pair(0, 0);
+}
+
+// Return whether a move leaves the opponent without a move, winning the game.
+bool CheckersEnv::wins(int move) const {
+  int from = action_from[move], to = action_to[move];
+  unsigned int from_bit = 1U << from, to_bit = 1U << to;
+  unsigned int own = (pieces[turn] & ~from_bit) | to_bit, other = pieces[1 - turn];
+  if (row(from) - row(to) == 2 || row(to) - row(from) == 2)
+    other &= ~(1U << (4 * ((row(from) + row(to)) / 2) + (col(from) + col(to)) / 4));
+  unsigned int new_kings = kings & ~from_bit;
+  if ((kings & from_bit) || (to_bit & PROMOTION[turn]))
+    new_kings |= to_bit;
+  return !has_moves(other, own, new_kings, 1 - turn);
+}
+
+// Return a move that wins at once, else a uniformly random move among those
+// of the highest priority, so that captures are made whenever possible.
+int CheckersEnv::heavy_move(XorShift& rng) const {
+  for (int i = 0; i < num_actions; i++)
+    if (wins(i))
+      return i;
+  int best = -1, count = 0, move = 0;
+  for (int i = 0; i < num_actions; i++) {
+    int p = priority(i);
+    if (p > best) {
+      best = p;
+      count = 0;
     }
-    if (actions.size()==0)
-    {
-        done=true;
-        if (turn == 0)
-        {
-            return std::make_pair(-1, 1);
-        }
-        else
-        {
-            return std::make_pair(1, -1);
-        }
+    if (p == best && rng.below(++count) == 0)
+      move = i;
+  }
+  return move;
+}
+
+// Write the board, 1 and 2 for the men and kings of the first player and
+// -1 and -2 for those of the second.
+void CheckersEnv::write_board(int* board) const {
+  for (int i = 0; i < 64; i++)
+    board[i] = 0;
+  for (int p = 0; p < 2; p++)
+    for (unsigned int m = pieces[p]; m; m &= m - 1) {
+      int square = lowest(m);
+      int piece = (kings & (1U << square)) ? 2 : 1;
+      board[8 * row(square) + col(square)] = p == 0 ? piece : -piece;
     }
-    return std::make_pair(0, 0);
 }
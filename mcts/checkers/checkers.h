@@ -3,15 +3,42 @@
 
 #include <utility>
 
+#include "../xorshift.h"
+#include "../zobrist.h"
+
+// Checkers on 32-square bitboards. Bit 4 * i + k stands for the k-th dark
+// square of row i, the square (i, 2 * k + 1) of an even row or (i, 2 * k)
+// of an odd row.
 class CheckersEnv {
 public:
+  static const int max_moves = 96;
+  static const int cells = 64;
+  // Random games still going after this many moves are scored as draws.
+  static const int max_playout_moves = 500;
   CheckersEnv();
   void reset();
   std::pair<float, float> step(int i1, int j1, int i2, int j2);
-  std::vector<std::pair<std::pair<int, int>, std::pair<int, int> > > actions;
+  int legal_moves(int* moves) const;
+  std::pair<float, float> play(int move);
+  int priority(int move) const;
+  std::pair<float, float> playout(unsigned long long seed, bool heavy = false) const;
+  void rollout(int k, unsigned long long seed, float* rewards, bool heavy = false) const;
+  void write_board(int* board) const;
+  std::pair<std::pair<int, int>, std::pair<int, int> > action(int move) const;
+  void find_actions();
   int turn;
   bool done;
-  int board[64];
+  unsigned long long hash;
+  unsigned int pieces[2];
+  unsigned int kings;
+  int num_actions;
+  unsigned char action_from[max_moves];
+  unsigned char action_to[max_moves];
+private:
+  std::pair<float, float> move(int from, int to);
+  bool wins(int move) const;
+  int heavy_move(XorShift& rng) const;
+  std::pair<float, float> play_random(XorShift& rng, bool heavy);
 };
 
 #endif
@@ -1,5 +1,4 @@
 from libcpp.utility cimport pair
-from libcpp.vector cimport vector
 
 
 cdef extern from "checkers.cpp":
@@ -11,7 +10,16 @@ cdef extern from "checkers.h":
         CheckersEnv(const CheckersEnv&)
         void reset()
         pair[float, float] step(int, int, int, int)
-        vector[pair[pair[int, int], pair[int, int]]] actions
+        pair[float, float] playout(unsigned long long, bint) nogil
+        void rollout(int, unsigned long long, float*, bint) nogil
+        int priority(int)
+        void write_board(int*)
+        pair[pair[int, int], pair[int, int]] action(int)
+        void find_actions()
         bint done
+        unsigned long long hash
         int turn
-        int[64] board
+        unsigned int[2] pieces
+        unsigned int kings
+        int num_actions
+
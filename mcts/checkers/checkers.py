@@ -127,8 +127,9 @@ class CheckersApp:
                 break
             else:
                 player = int(choice) - 1
-                agent = MCTSAgent()
+                agent = MCTSAgent(ponder=True, max_nodes=100000)
                 self.play_games(player, agent)
+                agent.stop_pondering()
 
     def play_games(self, player, agent):
         """Play games between player and agent."""
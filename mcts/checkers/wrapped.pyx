@@ -1,50 +1,177 @@
 # distutils: language = c++
 
+from libcpp.utility cimport pair
+
 from checkers cimport CheckersEnv
 
 import numpy as np
 
 
+ctypedef CheckersEnv GameEnv
+
+BOARD_SHAPE = (8, 8)
+
+include "../wrapped.pxi"
+
+
 cdef class CCheckersEnv:
     cdef CheckersEnv c_env
     cdef public int players
+    cdef object board_view
+    cdef bint board_stale
 
     def __cinit__(self):
         self.c_env = CheckersEnv()
         self.players = 2
+        self.board_view = None
 
     def reset(self):
+        """Start a new game and return its board as a new writable array."""
         self.c_env.reset()
-        return np.array(self.c_env.board).reshape(8, 8)
+        self.board_stale = True
+        return self.write_board(np.zeros((8, 8), dtype=np.intc))
 
     def step(self, action):
+        """Make a move and return the board, the rewards, whether the game is done and info.
+
+        The board is a new writable array on every call, whether or not the
+        board property has been read, so it can be kept as it is.
+        """
         ((i1, j1),(i2,j2)) = action
         reward = self.c_env.step(i1,j1,i2,j2)
-        state = np.array(self.c_env.board).reshape(8, 8)
-        return state, np.array(reward), self.c_env.done, {}
+        self.board_stale = True
+        board = self.write_board(np.zeros((8, 8), dtype=np.intc))
+        return board, np.array(reward), self.c_env.done, {}
+
+    def playout(self, seed, heavy=False):
+        """Return the total rewards of a random game from this state.
+
+        Moves are uniformly random, or from the heavy playout policy if heavy.
+        Games not over after 500 moves are scored as draws.
+        """
+        cdef unsigned long long c_seed = seed
+        cdef bint c_heavy = heavy
+        cdef pair[float, float] reward
+        with nogil:
+            reward = self.c_env.playout(c_seed, c_heavy)
+        return np.array(reward)
+
+    def rollout(self, k, seed, heavy=False):
+        """Return the rewards of k random games from this state as a k by 2 array.
+
+        Moves are uniformly random, or from the heavy playout policy if heavy.
+        Games not over after 500 moves are scored as draws.
+        """
+        rewards = np.zeros((k, 2), dtype=np.float32)
+        cdef float[:, ::1] c_rewards = rewards
+        cdef int c_k = k
+        cdef unsigned long long c_seed = seed
+        cdef bint c_heavy = heavy
+        if c_k > 0:
+            with nogil:
+                self.c_env.rollout(c_k, c_seed, &c_rewards[0, 0], c_heavy)
+        return rewards
+
+    def search(self, policy, param, timeout, iterations, nodes, seed, heavy=False):
+        """Run a native Monte Carlo tree search from this state.
+
+        Returns the actions of the root, their visit counts, their values as
+        an n by 2 array, the number of simulations and the number of nodes
+        added. Budgets of None are no limit. The playouts follow the heavy
+        playout policy if heavy.
+        """
+        moves, visits, values, simulations, size = run_search(
+            self.c_env, policy, param, timeout, iterations, nodes, seed, heavy)
+        return [self.c_env.action(m) for m in moves], visits, values, simulations, size
+
+    def parallel_search(self, policy, param, timeout, iterations, nodes, seed, heavy=False,
+                        threads=1, virtual_loss=1.0):
+        """Run a native Monte Carlo tree search from this state on several threads.
+
+        Returns the actions of the root, their visit counts, their values as
+        an n by 2 array, the number of simulations and the number of nodes
+        added. Budgets of None are no limit. The playouts follow the heavy
+        playout policy if heavy. The threads share one tree, and a
+        simulation in progress counts as a virtual loss of virtual_loss for
+        the player choosing each node on its path.
+        """
+        moves, visits, values, simulations, size = run_parallel_search(
+            self.c_env, policy, param, timeout, iterations, nodes, seed, heavy, threads,
+            virtual_loss)
+        return [self.c_env.action(m) for m in moves], visits, values, simulations, size
 
     def copy(self):
         copy = CCheckersEnv()
         copy.c_env = CheckersEnv(self.c_env)
         return copy
-    
+
+    def __reduce__(self):
+        return (CCheckersEnv, (), self.__getstate__())
+
+    def __getstate__(self):
+        return (self.c_env.pieces, self.c_env.kings, self.c_env.turn, self.c_env.done,
+                self.c_env.hash)
+
+    def __setstate__(self, state):
+        pieces, self.c_env.kings, self.c_env.turn, self.c_env.done, self.c_env.hash = state
+        self.c_env.pieces = pieces
+        self.c_env.find_actions()
+        self.board_stale = True
+
     @property
     def board(self):
-        return np.array(self.c_env.board).reshape(8, 8)
+        """A read-only view of the board, brought up to date when it is read.
+
+        The same array is returned each time and only refreshed by reading
+        the property after a move, so use its copy method to keep a
+        position. Step and reset return new arrays instead.
+        """
+        cdef int[:, ::1] c_board
+        if self.board_view is None:
+            # allocated on first use, so that copies made in the search stay cheap
+            self.board_view = np.zeros((8, 8), dtype=np.intc).view()
+            self.board_view.flags.writeable = False
+            self.board_stale = True
+        if self.board_stale:
+            # the view is read-only, so write through the array it views
+            c_board = self.board_view.base
+            self.c_env.write_board(&c_board[0, 0])
+            self.board_stale = False
+        return self.board_view
+
+    def write_board(self, out):
+        """Write the board into out, an intc array of shape (8, 8), and return it."""
+        cdef int[:, ::1] c_out = out
+        if c_out.shape[0] != 8 or c_out.shape[1] != 8:
+            raise ValueError(f'expected an array of shape (8, 8), got {out.shape}')
+        self.c_env.write_board(&c_out[0, 0])
+        return out
 
     @property
     def done(self):
         return self.c_env.done
 
+    @property
+    def hash(self):
+        return self.c_env.hash
+
     @property
     def turn(self):
         return self.c_env.turn
 
     @property
     def actions(self):
-        return self.c_env.actions
-        
-    
-    
-        
+        return [self.c_env.action(i) for i in range(self.c_env.num_actions)]
+
+    @property
+    def priorities(self):
+        """The move ordering priorities of the actions: 2 for a capture, plus 1 for a promotion."""
+        return [self.c_env.priority(i) for i in range(self.c_env.num_actions)]
+
+
+cdef class VecCheckersEnv(BatchEnv):
+    """A batch of Checkers games, as BatchEnv.
 
+    The moves are indices into the actions of each game, as in
+    CCheckersEnv.actions.
+    """
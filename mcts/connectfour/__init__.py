@@ -1 +1,2 @@
 from .connectfour import PyConnectFourEnv, CConnectFourEnv, ConnectFourApp, ConnectFourGUI
+from .wrapped import VecConnectFourEnv
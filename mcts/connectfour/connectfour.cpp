@@ -1,100 +1,130 @@
 #include "connectfour.h"
 
+// The bottom cell of each column.
+static const unsigned long long BOTTOM = 0x0040810204081ULL;
+
+// All cells of the board.
+static const unsigned long long FULL = BOTTOM * 0x3F;
+
+// Return whether the pieces of a player hold four in a row.
+static inline bool four_in_a_row(unsigned long long pieces) {
+  // vertical, horizontal and the two diagonals
+  static const int shifts[4] = {1, 7, 8, 6};
+  for (int d = 0; d < 4; d++) {
+    unsigned long long pairs = pieces & (pieces >> shifts[d]);
+    if (pairs & (pairs >> (2 * shifts[d])))
+      return true;
+  }
+  return false;
+}
+
 ConnectFourEnv::ConnectFourEnv() {
-  turn = 0;
-  count = 0;
-  for (int i = 0; i < 42; i++)
-    board[i] = 0;
-  done = false;
+  reset();
 }
 
 void ConnectFourEnv::reset() {
   turn = 0;
   count = 0;
-  for (int i = 0; i < 42; i++)
-    board[i] = 0;
+  pieces[0] = pieces[1] = 0;
+  for (int c = 0; c < 7; c++)
+    height[c] = 0;
   done = false;
+  hash = 0;
 }
 
 std::pair<float, float> ConnectFourEnv::step(int col) {
-  int token = (turn == 0 ? 1 : -1);
-  int row=0;
-  for(int r=5;r>=0;r--)
-  {
-      if(board[7*r + col]==0)
-      {
-          row=r;
-          r=-1;
-      }
-  }
-  board[7 * row + col] = token;
-
-  for(int c=0;c<4;c++)
-  {
-      if(board[7*row+c]==token && board[7*row+c+1]==token && board[7*row+c+2]==token && board[7*row+c+3]==token)
-      {
-          done = true;
-          if (turn == 0)
-              return std::make_pair(1, -1);
-          else
-              return std::make_pair(-1, 1);
-      }
-  }
-  for(int r=0;r<3;r++)
-  {
-      if(board[7*r+col]==token && board[7*(r+1)+col]==token && board[7*(r+2)+col]==token && board[7*(r+3)+col]==token)
-      {
-          done = true;
-          if (turn == 0)
-              return std::make_pair(1, -1);
-          else
-              return std::make_pair(-1, 1);
-      }
-  }
-  int m=0;
-  if(row<col)
-  {
-      m=row;
-  }
-  else
-  {
-      m=col;
-  }
-  row=row-m;
-  col=col-m;
-  for(int i=0;i<3;i++)
-  {
-      if(row+i+3<6 && col+i+3<7)
-      {
-          if(board[7*(row+i)+col+i]==token && board[7*(row+i+1)+col+i+1]==token && board[7*(row+i+2)+col+i+2]==token && board[7*(row+i+3)+col+i+3]==token)
-          {
-              done = true;
-              if (turn == 0)
-                  return std::make_pair(1, -1);
-              else
-                  return std::make_pair(-1, 1);
-          }
-      }
-  }
-  row=row+m;
-  col=col+m;
-  for(int r=5;r>=3;r--)
-  {
-      if(row+col-r>=0 && row+col-r<=3)
-      {
-          if(board[7*r+row+col-r]==token && board[7*(r-1)+row+col-r+1]==token && board[7*(r-2)+row+col-r+2]==token && board[7*(r-3)+row+col-r+3]==token)
-          {
-              done = true;
-              if (turn == 0)
-                  return std::make_pair(1, -1);
-              else
-                  return std::make_pair(-1, 1);
-          }
-      }
+  int row = 5 - height[col];
+  pieces[turn] |= 1ULL << (7 * col + height[col]++);
+  hash ^= zobrist(7 * row + col, turn);
+  if (four_in_a_row(pieces[turn])) {
+    done = true;
+    if (turn == 0)
+      return std::make_pair(1, -1);
+    else
+      return std::make_pair(-1, 1);
   }
-  
   if (++count == 42)
     done = true;
   turn = (turn + 1) % 2;
+  hash ^= ZOBRIST_TURN;
   return std::make_pair(0, 0);
 }
+
+// Return the mask of the cells a piece dropped in each column would take.
+unsigned long long ConnectFourEnv::legal_mask() const {
+  return ((pieces[0] | pieces[1]) + BOTTOM) & FULL;
+}
+
+// Write the legal moves as column indices and return their number.
+int ConnectFourEnv::legal_moves(int* moves) const {
+  int n = 0;
+  for (unsigned long long m = legal_mask(); m; m &= m - 1)
+    moves[n++] = __builtin_ctzll(m) / 7;
+  return n;
+}
+
+// Write the board with rows from the top, 1 for the first player and -1
+// for the second.
+void ConnectFourEnv::write_board(int* board) const {
+  for (int row = 0; row < 6; row++)
+    for (int col = 0; col < 7; col++) {
+      unsigned long long bit = 1ULL << (7 * col + 5 - row);
+      board[7 * row + col] = (pieces[0] & bit) ? 1 : (pieces[1] & bit) ? -1 : 0;
+    }
+}
+
+std::pair<float, float> ConnectFourEnv::play(int move) {
+  return step(move);
+}
+
+std::pair<float, float> ConnectFourEnv::playout(unsigned long long seed, bool heavy) const {
+  ConnectFourEnv env(*this);
+  XorShift rng(seed);
+  return env.play_random(rng, heavy);
+}
+
+void ConnectFourEnv::rollout(int k, unsigned long long seed, float* rewards, bool heavy) const {
+  XorShift rng(seed);
+  for (int i = 0; i < k; i++) {
+    ConnectFourEnv env(*this);
+    std::pair<float, float> reward = env.play_random(rng, heavy);
+    rewards[2 * i] = reward.first;
+    rewards[2 * i + 1] = reward.second;
+  }
+}
+
+std::pair<float, float> ConnectFourEnv::play_random(XorShift& rng, bool heavy) {
+  int moves[max_moves];
+  while (!done) {
+    int move;
+    if (heavy) {
+      move = heavy_move(rng);
+    } else {
+      int n = legal_moves(moves);
+      move = moves[rng.below(n)];
+    }
+    std::pair<float, float> reward = play(move);
+    if (done)
+      return reward;
+  }
+  return std::make_pair(0, 0);
+}
+
+// Return a move that wins at once, else one that blocks a win of the
+// opponent, else a uniformly random move.
+int ConnectFourEnv::heavy_move(XorShift& rng) const {
+  int moves[max_moves];
+  int n = legal_moves(moves);
+  for (int i = 0; i < n; i++)
+    if (completes_line(moves[i], turn))
+      return moves[i];
+  for (int i = 0; i < n; i++)
+    if (completes_line(moves[i], 1 - turn))
+      return moves[i];
+  return moves[rng.below(n)];
+}
+
+// Return whether a piece of the player dropped in the column completes four in a row.
+bool ConnectFourEnv::completes_line(int col, int player) const {
+  return four_in_a_row(pieces[player] | (1ULL << (7 * col + height[col])));
+}
@@ -3,16 +3,37 @@
 
 #include <utility>
 
+#include "../xorshift.h"
+#include "../zobrist.h"
+
+// Connect Four on bitboards. Bit 7 * col + r stands for the cell of column
+// col at height r from the bottom, with one unused bit on top of each column
+// so that shifts do not wrap from one column into the next.
 class ConnectFourEnv {
 public:
+  static const int max_moves = 7;
+  static const int cells = 42;
+  // A game ends once the board is full.
+  static const int max_playout_moves = 42;
   ConnectFourEnv();
   void reset();
   std::pair<float, float> step(int col);
+  int legal_moves(int* moves) const;
+  unsigned long long legal_mask() const;
+  std::pair<float, float> play(int move);
+  std::pair<float, float> playout(unsigned long long seed, bool heavy = false) const;
+  void rollout(int k, unsigned long long seed, float* rewards, bool heavy = false) const;
+  void write_board(int* board) const;
   int turn;
   bool done;
-  int board[42];
-private:
+  unsigned long long hash;
+  unsigned long long pieces[2];
+  int height[7];
   int count;
+private:
+  std::pair<float, float> play_random(XorShift& rng, bool heavy);
+  int heavy_move(XorShift& rng) const;
+  bool completes_line(int col, int player) const;
 };
 
 #endif
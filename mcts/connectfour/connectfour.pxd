@@ -9,6 +9,14 @@ cdef extern from "connectfour.h":
         ConnectFourEnv(const ConnectFourEnv&)
         void reset()
         pair[float, float] step(int)
+        unsigned long long legal_mask()
+        pair[float, float] playout(unsigned long long, bint) nogil
+        void rollout(int, unsigned long long, float*, bint) nogil
+        void write_board(int*)
         bint done
+        unsigned long long hash
         int turn
-        int[42] board
+        int count
+        unsigned long long[2] pieces
+        int[7] height
+
@@ -101,8 +101,9 @@ class ConnectFourApp:
                 self.interface.close()
                 break
             player = int(choice) - 1
-            agent = MCTSAgent()
+            agent = MCTSAgent(ponder=True, max_nodes=100000)
             self.play_games(player, agent)
+            agent.stop_pondering()
 
     def play_games(self, player, agent):
         """Play games between player and agent."""
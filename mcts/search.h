@@ -0,0 +1,439 @@
+#ifndef SEARCH_H
+#define SEARCH_H
+
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <utility>
+#include <vector>
+
+#include "xorshift.h"
+
+// Tree policies understood by Search and ParallelSearch.
+const int POLICY_UCB = 0;
+const int POLICY_EPSILON_GREEDY = 1;
+
+// A Monte Carlo tree search over a two player env, following MCTSAgent.
+//
+// Env must provide max_moves, turn, done, legal_moves(int* moves), play(int
+// move) and playout(seed, heavy). Nodes are kept in one array with the children of
+// a node stored contiguously, and envs are not stored but replayed from the
+// root along the path, so a node takes a few dozen bytes.
+template <class Env>
+class Search {
+public:
+  Search(int policy, float param, unsigned long long seed, bool heavy = false)
+    : policy(policy), param(param), heavy(heavy), rng(seed) {}
+
+  // Search from env until the first of the budgets is used up and return the
+  // number of simulations. A negative budget is no limit. The clock is read
+  // every check_every simulations.
+  long long run(const Env& env, double timeout, long long iterations, long long nodes) {
+    std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+    tree.clear();
+    tree.push_back(Node(-1, -1));
+    long long simulations = 0;
+    while ((iterations < 0 || simulations < iterations) &&
+           (nodes < 0 || size() < nodes)) {
+      if (timeout >= 0 && simulations % check_every == 0) {
+        std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+        if (elapsed.count() >= timeout)
+          break;
+      }
+      iterate(env);
+      simulations++;
+    }
+    return simulations;
+  }
+
+  // Return the number of nodes added below the root by the last run.
+  long long size() const {
+    return (long long)tree.size() - 1;
+  }
+
+  // Return the number of children of the root.
+  int root_size() const {
+    return tree[0].num_children;
+  }
+
+  // Write the move, visits and values of each child of the root.
+  void root_stats(int* moves, int* visits, float* values) const {
+    const Node& root = tree[0];
+    for (int i = 0; i < root.num_children; i++) {
+      const Node& child = tree[root.first_child + i];
+      moves[i] = child.move;
+      visits[i] = child.visits;
+      values[2 * i] = child.value[0];
+      values[2 * i + 1] = child.value[1];
+    }
+  }
+
+  static const int check_every = 16;
+
+private:
+  struct Node {
+    Node(int parent, int move)
+      : parent(parent), move(move), first_child(0), num_children(0), visits(0) {
+      reward[0] = reward[1] = 0;
+      value[0] = value[1] = 0;
+    }
+    int parent;
+    int move;
+    int first_child;
+    int num_children;
+    int visits;
+    float reward[2];
+    float value[2];
+  };
+
+  // Perform one selection, expansion, simulation and backup from the root.
+  void iterate(const Env& root) {
+    Env env(root);
+    int node = 0;
+    while (tree[node].visits != 0 && tree[node].num_children > 0) {
+      node = select(node, env.turn);
+      env.play(tree[node].move);
+    }
+    if (!env.done)
+      expand(node, env);
+    float value[2] = {0, 0};
+    if (!env.done) {
+      std::pair<float, float> reward = env.playout(rng.next(), heavy);
+      value[0] = reward.first;
+      value[1] = reward.second;
+    }
+    backup(node, value);
+  }
+
+  // Return the child of node chosen by the tree policy for the player to move.
+  int select(int node, int turn) {
+    const Node& parent = tree[node];
+    int first = parent.first_child, n = parent.num_children;
+    if (policy == POLICY_EPSILON_GREEDY && uniform() < param)
+      return first + rng.below(n);
+    int best = first;
+    float best_score = -INFINITY;
+    for (int i = first; i < first + n; i++) {
+      float score = tree[i].value[turn];
+      if (policy == POLICY_UCB) {
+        if (tree[i].visits == 0)
+          return i;
+        score += param * std::sqrt(std::log((float)parent.visits) / tree[i].visits);
+      }
+      if (score > best_score) {
+        best = i;
+        best_score = score;
+      }
+    }
+    return best;
+  }
+
+  // Return a number uniformly distributed in [0, 1).
+  double uniform() {
+    return (rng.next() >> 11) * (1.0 / 9007199254740992.0);
+  }
+
+  // Add children for all moves of env to node.
+  void expand(int node, const Env& env) {
+    int moves[Env::max_moves];
+    int n = env.legal_moves(moves);
+    int first = tree.size();
+    for (int i = 0; i < n; i++) {
+      Env child(env);
+      std::pair<float, float> reward = child.play(moves[i]);
+      tree.push_back(Node(node, moves[i]));
+      tree.back().reward[0] = reward.first;
+      tree.back().reward[1] = reward.second;
+    }
+    tree[node].first_child = first;
+    tree[node].num_children = n;
+  }
+
+  // Add the return value of a simulation from node to each node on the path to the root.
+  void backup(int node, float* value) {
+    while (node >= 0) {
+      Node& n = tree[node];
+      value[0] += n.reward[0];
+      value[1] += n.reward[1];
+      n.visits++;
+      n.value[0] += (value[0] - n.value[0]) / n.visits;
+      n.value[1] += (value[1] - n.value[1]) / n.visits;
+      node = n.parent;
+    }
+  }
+
+  int policy;
+  float param;
+  bool heavy;
+  XorShift rng;
+  std::vector<Node> tree;
+};
+
+// Add x to an atomic float.
+inline void atomic_add(std::atomic<float>& a, float x) {
+  float old = a.load(std::memory_order_relaxed);
+  while (!a.compare_exchange_weak(old, old + x, std::memory_order_relaxed))
+    ;
+}
+
+// A Monte Carlo tree search over a two player env from several threads on
+// one shared tree, following Search.
+//
+// No lock is held during a simulation. Visits and value sums are atomic, and
+// each node reached by a simulation in progress carries a virtual loss for
+// the player who chose it, which steers the other threads to different
+// branches. The first thread to reach a leaf expands it, and threads reaching
+// it meanwhile wait for the children to be published. Nodes are kept in
+// blocks that are never moved, so that they can be read while others are
+// added, with the children of a node stored contiguously.
+template <class Env>
+class ParallelSearch {
+public:
+  ParallelSearch(int policy, float param, unsigned long long seed, bool heavy,
+                 int threads, float virtual_loss)
+    : policy(policy), param(param), heavy(heavy), seed(seed), threads(threads),
+      virtual_loss(virtual_loss), blocks(max_blocks, nullptr), next(0), count(0) {}
+
+  ~ParallelSearch() {
+    for (size_t b = 0; b < blocks.size(); b++)
+      delete[] blocks[b];
+  }
+
+  // Search from env with the given number of threads, including the calling
+  // thread, until the first of the budgets is used up and return the number
+  // of simulations. A negative budget is no limit.
+  long long run(const Env& env, double timeout, long long iterations, long long nodes) {
+    std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+    std::chrono::steady_clock::time_point limit =
+      start + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+        std::chrono::duration<double>(timeout));
+    for (size_t b = 0; b < blocks.size(); b++) {
+      delete[] blocks[b];
+      blocks[b] = nullptr;
+    }
+    next = 0;
+    count = 0;
+    root = allocate(1);
+    init(root, -1, -1);
+    started = 0;
+    simulations = 0;
+    std::vector<std::thread> workers;
+    for (int t = 1; t < threads; t++)
+      workers.push_back(std::thread(&ParallelSearch::work, this, std::cref(env), timeout >= 0,
+                                    limit, iterations, nodes, seed + t));
+    work(env, timeout >= 0, limit, iterations, nodes, seed);
+    for (size_t t = 0; t < workers.size(); t++)
+      workers[t].join();
+    return simulations;
+  }
+
+  // Return the number of nodes added below the root by the last run.
+  long long size() const {
+    return count - 1;
+  }
+
+  // Return the number of children of the root.
+  int root_size() const {
+    return node(root).num_children;
+  }
+
+  // Write the move, visits and values of each child of the root.
+  void root_stats(int* moves, int* visits, float* values) const {
+    const Node& parent = node(root);
+    for (int i = 0; i < parent.num_children; i++) {
+      const Node& child = node(parent.first_child + i);
+      int n = child.visits;
+      moves[i] = child.move;
+      visits[i] = n;
+      values[2 * i] = n > 0 ? child.total[0] / n : 0;
+      values[2 * i + 1] = n > 0 ? child.total[1] / n : 0;
+    }
+  }
+
+  static const int check_every = 16;
+  static const int block_size = 1 << 14;
+  static const int max_blocks = 1 << 16;
+
+private:
+  enum { UNEXPANDED, EXPANDING, EXPANDED };
+
+  struct Node {
+    int parent;
+    int move;
+    int first_child;
+    int num_children;
+    std::atomic<int> state;
+    std::atomic<int> visits;
+    std::atomic<int> in_flight;
+    std::atomic<float> total[2];
+    float reward[2];
+  };
+
+  Node& node(long long i) const {
+    return blocks[i / block_size][i % block_size];
+  }
+
+  void init(long long i, int parent, int move) {
+    Node& n = node(i);
+    n.parent = parent;
+    n.move = move;
+    n.first_child = 0;
+    n.num_children = 0;
+    n.state.store(UNEXPANDED, std::memory_order_relaxed);
+    n.visits.store(0, std::memory_order_relaxed);
+    n.in_flight.store(0, std::memory_order_relaxed);
+    n.total[0].store(0, std::memory_order_relaxed);
+    n.total[1].store(0, std::memory_order_relaxed);
+    n.reward[0] = n.reward[1] = 0;
+  }
+
+  // Return the index of n contiguous new nodes, or -1 if there is no room.
+  long long allocate(int n) {
+    std::lock_guard<std::mutex> guard(allocation);
+    long long first = next;
+    if (first / block_size != (first + n - 1) / block_size)
+      first = (first / block_size + 1) * block_size;
+    long long b = first / block_size;
+    if (b >= max_blocks)
+      return -1;
+    if (blocks[b] == nullptr)
+      blocks[b] = new Node[block_size];
+    next = first + n;
+    count += n;
+    return first;
+  }
+
+  // Run simulations until a budget is used up.
+  void work(const Env& env, bool timed, std::chrono::steady_clock::time_point limit,
+            long long iterations, long long nodes, unsigned long long thread_seed) {
+    XorShift rng(thread_seed);
+    for (long long k = 0;; k++) {
+      if (timed && k % check_every == 0 && std::chrono::steady_clock::now() >= limit)
+        break;
+      if (nodes >= 0 && size() >= nodes)
+        break;
+      if (iterations >= 0 && started.fetch_add(1) >= iterations)
+        break;
+      iterate(env, rng);
+      simulations++;
+    }
+  }
+
+  // Perform one selection, expansion, simulation and backup from the root.
+  void iterate(const Env& start, XorShift& rng) {
+    Env env(start);
+    long long i = root;
+    node(i).in_flight++;
+    while (true) {
+      Node& n = node(i);
+      if (env.done)
+        break;
+      int state = n.state.load(std::memory_order_acquire);
+      if (state == UNEXPANDED &&
+          n.state.compare_exchange_strong(state, EXPANDING, std::memory_order_acquire)) {
+        expand(i, env);
+        break;
+      }
+      while (state == EXPANDING) {
+        std::this_thread::yield();
+        state = n.state.load(std::memory_order_acquire);
+      }
+      if (n.num_children == 0)
+        break;
+      i = select(i, env.turn, rng);
+      node(i).in_flight++;
+      env.play(node(i).move);
+    }
+    float value[2] = {0, 0};
+    if (!env.done) {
+      std::pair<float, float> reward = env.playout(rng.next(), heavy);
+      value[0] = reward.first;
+      value[1] = reward.second;
+    }
+    backup(i, value);
+  }
+
+  // Return the child of node chosen by the tree policy for the player to move.
+  long long select(long long i, int turn, XorShift& rng) {
+    const Node& parent = node(i);
+    long long first = parent.first_child;
+    int n = parent.num_children;
+    if (policy == POLICY_EPSILON_GREEDY &&
+        (rng.next() >> 11) * (1.0 / 9007199254740992.0) < param)
+      return first + rng.below(n);
+    float log_visits = std::log((float)(parent.visits + parent.in_flight));
+    long long best = first;
+    float best_score = -INFINITY;
+    for (long long c = first; c < first + n; c++) {
+      const Node& child = node(c);
+      int in_flight = child.in_flight;
+      int visits = child.visits + in_flight;
+      if (visits == 0 && policy == POLICY_UCB)
+        return c;
+      float score = 0;
+      if (visits > 0)
+        score = (child.total[turn] - virtual_loss * in_flight) / visits;
+      if (policy == POLICY_UCB)
+        score += param * std::sqrt(log_visits / visits);
+      if (score > best_score) {
+        best = c;
+        best_score = score;
+      }
+    }
+    return best;
+  }
+
+  // Add children for all moves of env to the node and publish them. The node
+  // stays a leaf when there is no room.
+  void expand(long long i, const Env& env) {
+    int moves[Env::max_moves];
+    int n = env.legal_moves(moves);
+    long long first = allocate(n);
+    if (first >= 0) {
+      for (int k = 0; k < n; k++) {
+        Env child(env);
+        std::pair<float, float> reward = child.play(moves[k]);
+        init(first + k, i, moves[k]);
+        node(first + k).reward[0] = reward.first;
+        node(first + k).reward[1] = reward.second;
+      }
+      node(i).first_child = first;
+      node(i).num_children = n;
+    }
+    node(i).state.store(EXPANDED, std::memory_order_release);
+  }
+
+  // Add the return value of a simulation from node to each node on the path
+  // to the root and remove the virtual losses.
+  void backup(long long i, float* value) {
+    while (i >= 0) {
+      Node& n = node(i);
+      value[0] += n.reward[0];
+      value[1] += n.reward[1];
+      atomic_add(n.total[0], value[0]);
+      atomic_add(n.total[1], value[1]);
+      n.visits++;
+      n.in_flight--;
+      i = n.parent;
+    }
+  }
+
+  int policy;
+  float param;
+  bool heavy;
+  unsigned long long seed;
+  int threads;
+  float virtual_loss;
+  std::vector<Node*> blocks;
+  std::mutex allocation;
+  std::atomic<long long> next;
+  std::atomic<long long> count;
+  long long root;
+  std::atomic<long long> started;
+  std::atomic<long long> simulations;
+};
+
+#endif
@@ -1 +1,3 @@
 from .tictactoe import CTicTacToeEnv, PyTicTacToeEnv, TicTacToeApp, TicTacToeGUI
+from .wrapped import VecTicTacToeEnv
+from .perfect import PerfectPlayTable, position_code
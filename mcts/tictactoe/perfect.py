@@ -0,0 +1,107 @@
+"""A table of the exact values of all Tic-Tac-Toe positions."""
+
+import numpy as np
+
+from .wrapped import CTicTacToeEnv
+
+
+UNKNOWN = -128
+
+
+def position_code(board):
+    """Return the index of a board in the table.
+
+    Each cell is a base 3 digit, 0 for empty, 1 for the first player and 2
+    for the second, with the top left cell the least significant. The player
+    to move follows from the number of tokens, so the code identifies the
+    position.
+    """
+    return int(np.dot(np.asarray(board).ravel() % 3, 3 ** np.arange(9)))
+
+
+def env_code(env):
+    """Return the index of the position of a CTicTacToeEnv in the table.
+
+    The board is written to a new array rather than read from env.board, so
+    that the envs of a search do not keep a board view.
+    """
+    return position_code(env.write_board(np.empty((3, 3), dtype=np.intc)))
+
+
+class PerfectPlayTable:
+    """The exact values of the Tic-Tac-Toe positions under perfect play.
+
+    The values are kept in an int8 array of 3 ** 9 entries indexed by
+    position_code, holding the return of the first player from the position,
+    1 for a win, 0 for a draw and -1 for a loss, or UNKNOWN for boards that
+    can not be reached. Calling the table with a CTicTacToeEnv returns the
+    total rewards of the players from it, so it can be given to MCTSAgent
+    as exact.
+
+    Parameters
+    ----------
+    values : array
+        The values indexed by position_code.
+
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def build(cls):
+        """Return the table of all positions reachable from the empty board."""
+        values = np.full(3 ** 9, UNKNOWN, dtype=np.int8)
+        cls._solve(CTicTacToeEnv(), values)
+        return cls(values)
+
+    @classmethod
+    def _solve(cls, env, values):
+        """Fill in values for env and all positions after it and return the value of env."""
+        code = env_code(env)
+        if values[code] != UNKNOWN:
+            return values[code]
+        if env.done:
+            value = 0
+        else:
+            sign = 1 if env.turn == 0 else -1
+            value = None
+            for action in env.actions:
+                child = env.copy()
+                _, rewards, _, _ = child.step(action)
+                child_value = rewards[0] + cls._solve(child, values)
+                if value is None or sign * child_value > sign * value:
+                    value = child_value
+        values[code] = value
+        return value
+
+    @classmethod
+    def load(cls, path):
+        """Return the table saved at path."""
+        return cls(np.load(path))
+
+    def save(self, path):
+        """Save the table to path in the .npy format."""
+        np.save(path, self.values)
+
+    def __call__(self, env):
+        """Return the total rewards of the players from env under perfect play, or None."""
+        value = self.values[env_code(env)]
+        if value == UNKNOWN:
+            return None
+        return np.array([value, -value], dtype=float)
+
+    def __len__(self):
+        """Return the number of reachable positions."""
+        return int(np.count_nonzero(self.values != UNKNOWN))
+
+    def best_actions(self, env):
+        """Return the actions of env that keep its value under perfect play."""
+        target = self(env)[env.turn]
+        best = []
+        for action in env.actions:
+            child = env.copy()
+            _, rewards, _, _ = child.step(action)
+            if rewards[env.turn] + self(child)[env.turn] == target:
+                best.append(action)
+        return best
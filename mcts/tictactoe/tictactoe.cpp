@@ -1,38 +1,129 @@
 #include "tictactoe.h"
 
+// The mask of all cells.
+static const unsigned int ALL = 0x1FF;
+
+// A table of whether each of the 512 masks holds a line.
+struct WinTable {
+  WinTable() {
+    static const unsigned int lines[8] = {0007, 0070, 0700, 0111, 0222, 0444, 0421, 0124};
+    for (unsigned int m = 0; m <= ALL; m++) {
+      wins[m] = false;
+      for (int l = 0; l < 8; l++)
+        if ((m & lines[l]) == lines[l])
+          wins[m] = true;
+    }
+  }
+  bool wins[ALL + 1];
+};
+
+static const WinTable WIN_TABLE;
+
+// Return whether a mask of cells holds three in a row.
+static inline bool has_line(unsigned int mask) {
+  return WIN_TABLE.wins[mask];
+}
+
 TicTacToeEnv::TicTacToeEnv() {
-  turn = 0;
-  count = 0;
-  for (int i = 0; i < 9; i++)
-    board[i] = 0;
-  done = false;
+  reset();
 }
 
 void TicTacToeEnv::reset() {
   turn = 0;
   count = 0;
-  for (int i = 0; i < 9; i++)
-    board[i] = 0;
+  marks[0] = marks[1] = 0;
   done = false;
+  hash = 0;
 }
 
 std::pair<float, float> TicTacToeEnv::step(int row, int col) {
-  int token = (turn == 0 ? 1 : -1);
-  board[3 * row + col] = token;
-
-  if ((board[3 * row] == token && board[3 * row + 1] == token && board[3 * row + 2] == token) ||
-      (board[col] == token && board[col + 3] == token && board[col + 6] == token) ||
-      (row == col && board[0] == token && board[4] == token && board[8] == token) ||
-      (row + col == 2 && board[2] == token && board[4] == token && board[6] == token)) {
+  marks[turn] |= 1U << (3 * row + col);
+  hash ^= zobrist(3 * row + col, turn);
+  if (has_line(marks[turn])) {
     done = true;
     if (turn == 0)
       return std::make_pair(1, -1);
     else
       return std::make_pair(-1, 1);
   }
-
   if (++count == 9)
     done = true;
   turn = (turn + 1) % 2;
+  hash ^= ZOBRIST_TURN;
   return std::make_pair(0, 0);
 }
+
+// Return the mask of the empty cells.
+unsigned int TicTacToeEnv::legal_mask() const {
+  return ~(marks[0] | marks[1]) & ALL;
+}
+
+// Write the legal moves as cell indices 3 * row + col and return their number.
+int TicTacToeEnv::legal_moves(int* moves) const {
+  int n = 0;
+  for (unsigned int m = legal_mask(); m; m &= m - 1)
+    moves[n++] = __builtin_ctz(m);
+  return n;
+}
+
+std::pair<float, float> TicTacToeEnv::play(int move) {
+  return step(move / 3, move % 3);
+}
+
+std::pair<float, float> TicTacToeEnv::playout(unsigned long long seed, bool heavy) const {
+  TicTacToeEnv env(*this);
+  XorShift rng(seed);
+  return env.play_random(rng, heavy);
+}
+
+void TicTacToeEnv::rollout(int k, unsigned long long seed, float* rewards, bool heavy) const {
+  XorShift rng(seed);
+  for (int i = 0; i < k; i++) {
+    TicTacToeEnv env(*this);
+    std::pair<float, float> reward = env.play_random(rng, heavy);
+    rewards[2 * i] = reward.first;
+    rewards[2 * i + 1] = reward.second;
+  }
+}
+
+std::pair<float, float> TicTacToeEnv::play_random(XorShift& rng, bool heavy) {
+  int moves[max_moves];
+  while (!done) {
+    int move;
+    if (heavy) {
+      move = heavy_move(rng);
+    } else {
+      int n = legal_moves(moves);
+      move = moves[rng.below(n)];
+    }
+    std::pair<float, float> reward = play(move);
+    if (done)
+      return reward;
+  }
+  return std::make_pair(0, 0);
+}
+
+// Return a move that wins at once, else one that blocks a win of the
+// opponent, else a uniformly random move.
+int TicTacToeEnv::heavy_move(XorShift& rng) const {
+  int moves[max_moves];
+  int n = legal_moves(moves);
+  for (int i = 0; i < n; i++)
+    if (completes_line(moves[i], turn))
+      return moves[i];
+  for (int i = 0; i < n; i++)
+    if (completes_line(moves[i], 1 - turn))
+      return moves[i];
+  return moves[rng.below(n)];
+}
+
+// Return whether a mark of the player on the empty cell completes a line.
+bool TicTacToeEnv::completes_line(int cell, int player) const {
+  return has_line(marks[player] | (1U << cell));
+}
+
+// Write the board, 1 for the first player and -1 for the second.
+void TicTacToeEnv::write_board(int* board) const {
+  for (int i = 0; i < 9; i++)
+    board[i] = (marks[0] >> i & 1) - (marks[1] >> i & 1);
+}
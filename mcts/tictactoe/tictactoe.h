@@ -3,16 +3,34 @@
 
 #include <utility>
 
+#include "../xorshift.h"
+#include "../zobrist.h"
+
+// Tic-Tac-Toe on 9-bit masks, with bit 3 * row + col for each cell.
 class TicTacToeEnv {
 public:
+  static const int max_moves = 9;
+  static const int cells = 9;
+  // A game ends once the board is full.
+  static const int max_playout_moves = 9;
   TicTacToeEnv();
   void reset();
   std::pair<float, float> step(int row, int col);
+  int legal_moves(int* moves) const;
+  unsigned int legal_mask() const;
+  std::pair<float, float> play(int move);
+  std::pair<float, float> playout(unsigned long long seed, bool heavy = false) const;
+  void rollout(int k, unsigned long long seed, float* rewards, bool heavy = false) const;
+  void write_board(int* board) const;
   int turn;
   bool done;
-  int board[9];
-private:
+  unsigned long long hash;
+  unsigned int marks[2];
   int count;
+private:
+  std::pair<float, float> play_random(XorShift& rng, bool heavy);
+  int heavy_move(XorShift& rng) const;
+  bool completes_line(int cell, int player) const;
 };
 
 #endif
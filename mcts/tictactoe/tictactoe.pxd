@@ -9,6 +9,13 @@ cdef extern from "tictactoe.h":
         TicTacToeEnv(const TicTacToeEnv&)
         void reset()
         pair[float, float] step(int, int)
+        pair[float, float] playout(unsigned long long, bint) nogil
+        void rollout(int, unsigned long long, float*, bint) nogil
+        void write_board(int*)
+        unsigned int legal_mask()
         bint done
+        unsigned long long hash
         int turn
-        int[9] board
+        int count
+        unsigned int[2] marks
+
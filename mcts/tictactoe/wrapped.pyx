@@ -1,47 +1,173 @@
 # distutils: language = c++
 
+from libcpp.utility cimport pair
+
 from tictactoe cimport TicTacToeEnv
 
 import numpy as np
 
 
+ctypedef TicTacToeEnv GameEnv
+
+BOARD_SHAPE = (3, 3)
+
+include "../wrapped.pxi"
+
+
+# The empty cells of each legal mask as (row, col) actions.
+ACTIONS = [[(i // 3, i % 3) for i in range(9) if mask >> i & 1] for mask in range(512)]
+
+
 cdef class CTicTacToeEnv:
     cdef TicTacToeEnv c_env
     cdef public int players
+    cdef object board_view
+    cdef bint board_stale
 
     def __cinit__(self):
         self.c_env = TicTacToeEnv()
         self.players = 2
+        self.board_view = None
 
     def reset(self):
+        """Start a new game and return its board as a new writable array."""
         self.c_env.reset()
-        return np.array(self.c_env.board).reshape(3, 3)
+        self.board_stale = True
+        return self.write_board(np.zeros((3, 3), dtype=np.intc))
 
     def step(self, action):
+        """Make a move and return the board, the rewards, whether the game is done and info.
+
+        The board is a new writable array on every call, whether or not the
+        board property has been read, so it can be kept as it is.
+        """
         row, col = action
         reward = self.c_env.step(row, col)
-        state = np.array(self.c_env.board).reshape(3, 3)
-        return state, np.array(reward), self.c_env.done, {}
+        self.board_stale = True
+        board = self.write_board(np.zeros((3, 3), dtype=np.intc))
+        return board, np.array(reward), self.c_env.done, {}
+
+    def playout(self, seed, heavy=False):
+        """Return the total rewards of a random game from this state.
+
+        Moves are uniformly random, or from the heavy playout policy if heavy.
+        """
+        cdef unsigned long long c_seed = seed
+        cdef bint c_heavy = heavy
+        cdef pair[float, float] reward
+        with nogil:
+            reward = self.c_env.playout(c_seed, c_heavy)
+        return np.array(reward)
+
+    def rollout(self, k, seed, heavy=False):
+        """Return the rewards of k random games from this state as a k by 2 array.
+
+        Moves are uniformly random, or from the heavy playout policy if heavy.
+        """
+        rewards = np.zeros((k, 2), dtype=np.float32)
+        cdef float[:, ::1] c_rewards = rewards
+        cdef int c_k = k
+        cdef unsigned long long c_seed = seed
+        cdef bint c_heavy = heavy
+        if c_k > 0:
+            with nogil:
+                self.c_env.rollout(c_k, c_seed, &c_rewards[0, 0], c_heavy)
+        return rewards
+
+    def search(self, policy, param, timeout, iterations, nodes, seed, heavy=False):
+        """Run a native Monte Carlo tree search from this state.
+
+        Returns the actions of the root, their visit counts, their values as
+        an n by 2 array, the number of simulations and the number of nodes
+        added. Budgets of None are no limit. The playouts follow the heavy
+        playout policy if heavy.
+        """
+        moves, visits, values, simulations, size = run_search(
+            self.c_env, policy, param, timeout, iterations, nodes, seed, heavy)
+        return [(m // 3, m % 3) for m in moves], visits, values, simulations, size
+
+    def parallel_search(self, policy, param, timeout, iterations, nodes, seed, heavy=False,
+                        threads=1, virtual_loss=1.0):
+        """Run a native Monte Carlo tree search from this state on several threads.
+
+        Returns the actions of the root, their visit counts, their values as
+        an n by 2 array, the number of simulations and the number of nodes
+        added. Budgets of None are no limit. The playouts follow the heavy
+        playout policy if heavy. The threads share one tree, and a
+        simulation in progress counts as a virtual loss of virtual_loss for
+        the player choosing each node on its path.
+        """
+        moves, visits, values, simulations, size = run_parallel_search(
+            self.c_env, policy, param, timeout, iterations, nodes, seed, heavy, threads,
+            virtual_loss)
+        return [(m // 3, m % 3) for m in moves], visits, values, simulations, size
 
     def copy(self):
         copy = CTicTacToeEnv()
         copy.c_env = TicTacToeEnv(self.c_env)
         return copy
-    
+
+    def __reduce__(self):
+        return (CTicTacToeEnv, (), self.__getstate__())
+
+    def __getstate__(self):
+        return self.c_env.marks, self.c_env.turn, self.c_env.done, self.c_env.count, self.c_env.hash
+
+    def __setstate__(self, state):
+        marks, self.c_env.turn, self.c_env.done, self.c_env.count, self.c_env.hash = state
+        self.c_env.marks = marks
+        self.board_stale = True
+
     @property
     def board(self):
-        return np.array(self.c_env.board).reshape(3, 3)
+        """A read-only view of the board, brought up to date when it is read.
+
+        The same array is returned each time and only refreshed by reading
+        the property after a move, so use its copy method to keep a
+        position. Step and reset return new arrays instead.
+        """
+        cdef int[:, ::1] c_board
+        if self.board_view is None:
+            # allocated on first use, so that copies made in the search stay cheap
+            self.board_view = np.zeros((3, 3), dtype=np.intc).view()
+            self.board_view.flags.writeable = False
+            self.board_stale = True
+        if self.board_stale:
+            # the view is read-only, so write through the array it views
+            c_board = self.board_view.base
+            self.c_env.write_board(&c_board[0, 0])
+            self.board_stale = False
+        return self.board_view
+
+    def write_board(self, out):
+        """Write the board into out, an intc array of shape (3, 3), and return it."""
+        cdef int[:, ::1] c_out = out
+        if c_out.shape[0] != 3 or c_out.shape[1] != 3:
+            raise ValueError(f'expected an array of shape (3, 3), got {out.shape}')
+        self.c_env.write_board(&c_out[0, 0])
+        return out
 
     @property
     def done(self):
         return self.c_env.done
 
+    @property
+    def hash(self):
+        return self.c_env.hash
+
     @property
     def turn(self):
         return self.c_env.turn
 
     @property
     def actions(self):
-        return [(i, j) for i in range(3) for j in range(3)
-                if self.c_env.board[3*i + j] == 0]
+        return list(ACTIONS[self.c_env.legal_mask()])
+
+    @property
+    def legal_mask(self):
+        """The empty cells as a 9-bit mask, with bit 3 * row + col for each cell."""
+        return self.c_env.legal_mask()
+
 
+cdef class VecTicTacToeEnv(BatchEnv):
+    """A batch of Tic-Tac-Toe games, as BatchEnv, with the cells 3 * row + col as moves."""
@@ -0,0 +1,108 @@
+#ifndef VEC_H
+#define VEC_H
+
+#include <stdexcept>
+#include <utility>
+#include <vector>
+
+#include "xorshift.h"
+
+// A batch of games of a two player env stepped in lockstep.
+//
+// Env must provide max_moves, cells, max_playout_moves, turn, done, reset(),
+// legal_moves(int* moves), play(int move) and write_board(int* board). The
+// envs are kept in one array, and a game is reset as soon as it ends, so that
+// every game always has a move to make. A game still going after move_limit
+// moves ends as a draw.
+template <class Env>
+class VecEnv {
+public:
+  VecEnv(int n, int move_limit = Env::max_playout_moves)
+    : envs(n), moves_played(n), limit(move_limit) {}
+
+  int size() const {
+    return envs.size();
+  }
+
+  int max_moves() const {
+    return Env::max_moves;
+  }
+
+  int move_limit() const {
+    return limit;
+  }
+
+  void reset() {
+    for (size_t i = 0; i < envs.size(); i++) {
+      envs[i].reset();
+      moves_played[i] = 0;
+    }
+  }
+
+  // Play moves[i] in game i and write the rewards of the move for both
+  // players to rewards[2 * i] and rewards[2 * i + 1] and whether it ended the
+  // game, which is then reset, to dones[i]. A game that reaches the move
+  // limit ends as a draw with the rewards of its last move. Throws
+  // std::invalid_argument before changing any game if a move is not legal.
+  void step(const int* moves, float* rewards, unsigned char* dones) {
+    int legal[Env::max_moves];
+    for (size_t i = 0; i < envs.size(); i++) {
+      int n = envs[i].legal_moves(legal);
+      int k = 0;
+      while (k < n && legal[k] != moves[i])
+        k++;
+      if (k == n)
+        throw std::invalid_argument("illegal move");
+    }
+    for (size_t i = 0; i < envs.size(); i++) {
+      std::pair<float, float> reward = envs[i].play(moves[i]);
+      rewards[2 * i] = reward.first;
+      rewards[2 * i + 1] = reward.second;
+      dones[i] = envs[i].done || ++moves_played[i] >= limit;
+      if (dones[i]) {
+        envs[i].reset();
+        moves_played[i] = 0;
+      }
+    }
+  }
+
+  // Write whether each move of each game is legal to the size() by max_moves
+  // array mask.
+  void legal_mask(unsigned char* mask) const {
+    int legal[Env::max_moves];
+    for (size_t i = 0; i < envs.size(); i++) {
+      unsigned char* row = mask + i * Env::max_moves;
+      for (int m = 0; m < Env::max_moves; m++)
+        row[m] = 0;
+      int n = envs[i].legal_moves(legal);
+      for (int k = 0; k < n; k++)
+        row[legal[k]] = 1;
+    }
+  }
+
+  // Write a uniformly random legal move of each game to moves.
+  void random_moves(unsigned long long seed, int* moves) const {
+    XorShift rng(seed);
+    int legal[Env::max_moves];
+    for (size_t i = 0; i < envs.size(); i++) {
+      int n = envs[i].legal_moves(legal);
+      moves[i] = legal[rng.below(n)];
+    }
+  }
+
+  // Write the boards of the games to the size() by cells array boards and
+  // the players to move to turns.
+  void observe(int* boards, int* turns) const {
+    for (size_t i = 0; i < envs.size(); i++) {
+      envs[i].write_board(boards + i * Env::cells);
+      turns[i] = envs[i].turn;
+    }
+  }
+
+private:
+  std::vector<Env> envs;
+  std::vector<int> moves_played;
+  int limit;
+};
+
+#endif
@@ -0,0 +1,178 @@
+# Native search and batch env wrappers shared by the Cython envs.
+#
+# Included by each wrapped.pyx after it defines GameEnv as its C++ env and
+# BOARD_SHAPE as the shape of its board.
+
+from libcpp.memory cimport unique_ptr
+
+import numpy as np
+
+
+cdef extern from "../search.h":
+    cdef cppclass Search[E]:
+        Search(int, float, unsigned long long, bint) except +
+        long long run(const E&, double, long long, long long) nogil
+        long long size()
+        int root_size()
+        void root_stats(int*, int*, float*)
+
+    cdef cppclass ParallelSearch[E]:
+        ParallelSearch(int, float, unsigned long long, bint, int, float) except +
+        long long run(const E&, double, long long, long long) nogil except +
+        long long size()
+        int root_size()
+        void root_stats(int*, int*, float*)
+
+
+cdef extern from "../vec.h":
+    cdef cppclass VecEnv[E]:
+        VecEnv(int) except +
+        VecEnv(int, int) except +
+        int size()
+        int max_moves()
+        int move_limit()
+        void reset()
+        void step(const int*, float*, unsigned char*) nogil except +
+        void legal_mask(unsigned char*) nogil
+        void random_moves(unsigned long long, int*) nogil
+        void observe(int*, int*)
+
+
+ctypedef fused AnySearch:
+    Search[GameEnv]
+    ParallelSearch[GameEnv]
+
+
+cdef run(AnySearch* search, const GameEnv& env, timeout, iterations, nodes):
+    """Run search from env and return the moves of the root and the other results.
+
+    The results are the move indices of the root, their visit counts, their
+    values as an n by 2 array, the number of simulations and the number of
+    nodes added. Budgets of None are no limit.
+    """
+    cdef double c_timeout = -1 if timeout is None else timeout
+    cdef long long c_iterations = -1 if iterations is None else iterations
+    cdef long long c_nodes = -1 if nodes is None else nodes
+    cdef long long simulations
+    with nogil:
+        simulations = search.run(env, c_timeout, c_iterations, c_nodes)
+    n = search.root_size()
+    moves = np.zeros(n, dtype=np.intc)
+    visits = np.zeros(n, dtype=np.intc)
+    values = np.zeros((n, 2), dtype=np.float32)
+    cdef int[::1] c_moves = moves
+    cdef int[::1] c_visits = visits
+    cdef float[:, ::1] c_values = values
+    if n > 0:
+        search.root_stats(&c_moves[0], &c_visits[0], &c_values[0, 0])
+    return [int(m) for m in moves], visits, values, simulations, search.size()
+
+
+cdef run_search(const GameEnv& env, policy, param, timeout, iterations, nodes, seed, heavy):
+    """Run a native Monte Carlo tree search from env, with the results of run."""
+    cdef unique_ptr[Search[GameEnv]] search
+    search.reset(new Search[GameEnv](policy, param, seed, heavy))
+    return run(search.get(), env, timeout, iterations, nodes)
+
+
+cdef run_parallel_search(const GameEnv& env, policy, param, timeout, iterations, nodes, seed,
+                         heavy, threads, virtual_loss):
+    """Run a native Monte Carlo tree search from env on threads, with the results of run."""
+    cdef unique_ptr[ParallelSearch[GameEnv]] search
+    search.reset(new ParallelSearch[GameEnv](policy, param, seed, heavy, threads,
+                                             virtual_loss))
+    return run(search.get(), env, timeout, iterations, nodes)
+
+
+cdef class BatchEnv:
+    """A batch of games stepped together with one call per move.
+
+    The games are kept in a C++ array and exchanged as NumPy arrays. A game
+    that ends is reset at once, so every game always has a move to make.
+
+    Parameters
+    ----------
+    n : int, optional
+        The number of games.
+    move_limit : int, optional
+        If given, the number of moves after which a game that is still going
+        ends as a draw, else the most moves of a native random game.
+
+    """
+    cdef unique_ptr[VecEnv[GameEnv]] c_vec
+    cdef public int players
+
+    def __cinit__(self, n=1, move_limit=None):
+        if move_limit is None:
+            self.c_vec.reset(new VecEnv[GameEnv](n))
+        else:
+            self.c_vec.reset(new VecEnv[GameEnv](n, move_limit))
+        self.players = 2
+
+    def __len__(self):
+        return self.c_vec.get().size()
+
+    def reset(self, n=None):
+        """Start new games, n of them if given, and return the boards."""
+        if n is not None:
+            self.c_vec.reset(new VecEnv[GameEnv](n, self.c_vec.get().move_limit()))
+        else:
+            self.c_vec.get().reset()
+        return self.board
+
+    def step(self, actions):
+        """Play one move in each game.
+
+        Returns the boards, the rewards of the moves as an n by 2 array,
+        whether each move ended its game, in which case the board is that of
+        the new game, and an empty dict. Raises ValueError without playing
+        any move if a move is not legal.
+        """
+        cdef int[::1] c_moves = np.ascontiguousarray(actions, dtype=np.intc)
+        if c_moves.shape[0] != len(self):
+            raise ValueError(f'expected {len(self)} actions, got {c_moves.shape[0]}')
+        rewards = np.zeros((len(self), 2), dtype=np.float32)
+        dones = np.zeros(len(self), dtype=np.uint8)
+        cdef float[:, ::1] c_rewards = rewards
+        cdef unsigned char[::1] c_dones = dones
+        if len(self) > 0:
+            with nogil:
+                self.c_vec.get().step(&c_moves[0], &c_rewards[0, 0], &c_dones[0])
+        return self.board, rewards, dones.view(bool), {}
+
+    def legal_mask(self):
+        """Return whether each move is legal in each game as an n by max moves array."""
+        mask = np.zeros((len(self), self.c_vec.get().max_moves()), dtype=np.uint8)
+        cdef unsigned char[:, ::1] c_mask = mask
+        if len(self) > 0:
+            with nogil:
+                self.c_vec.get().legal_mask(&c_mask[0, 0])
+        return mask.view(bool)
+
+    def random_actions(self, seed):
+        """Return a uniformly random legal move for each game."""
+        moves = np.zeros(len(self), dtype=np.intc)
+        cdef int[::1] c_moves = moves
+        cdef unsigned long long c_seed = seed
+        if len(self) > 0:
+            with nogil:
+                self.c_vec.get().random_moves(c_seed, &c_moves[0])
+        return moves
+
+    def observe(self):
+        """Return the boards and the players to move."""
+        boards = np.zeros((len(self),) + BOARD_SHAPE, dtype=np.intc)
+        turns = np.zeros(len(self), dtype=np.intc)
+        cdef int[:, :, ::1] c_boards = boards
+        cdef int[::1] c_turns = turns
+        if len(self) > 0:
+            self.c_vec.get().observe(&c_boards[0, 0, 0], &c_turns[0])
+        return boards, turns
+
+    @property
+    def board(self):
+        return self.observe()[0]
+
+    @property
+    def turn(self):
+        return self.observe()[1]
@@ -0,0 +1,38 @@
+#ifndef XORSHIFT_H
+#define XORSHIFT_H
+
+// Return x scrambled by the splitmix64 mixing function.
+inline unsigned long long splitmix64(unsigned long long x) {
+  x += 0x9E3779B97F4A7C15ULL;
+  x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+  x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+  return x ^ (x >> 31);
+}
+
+// A fast xorshift64* pseudorandom number generator for random playouts.
+class XorShift {
+public:
+  XorShift(unsigned long long seed) {
+    // Scramble the seed so that nearby seeds give unrelated streams.
+    state = splitmix64(seed);
+    if (state == 0)
+      state = 1;
+  }
+
+  unsigned long long next() {
+    state ^= state >> 12;
+    state ^= state << 25;
+    state ^= state >> 27;
+    return state * 0x2545F4914F6CDD1DULL;
+  }
+
+  // Return an integer uniformly distributed in [0, n).
+  int below(int n) {
+    return (int)(((next() >> 32) * (unsigned long long)n) >> 32);
+  }
+
+private:
+  unsigned long long state;
+};
+
+#endif
@@ -0,0 +1,15 @@
+#ifndef ZOBRIST_H
+#define ZOBRIST_H
+
+#include "xorshift.h"
+
+// Return the Zobrist key of a piece on a square. Keys are computed from the
+// square and piece indices with splitmix64 rather than stored in a table.
+inline unsigned long long zobrist(int square, int piece) {
+  return splitmix64(8 * (unsigned long long)square + piece);
+}
+
+// The Zobrist key of the second player being to move.
+const unsigned long long ZOBRIST_TURN = 0xF1357AEA2E62A9C5ULL;
+
+#endif
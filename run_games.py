@@ -4,9 +4,10 @@ import argparse
 
 import numpy as np
 
-from mcts.agents import MCTSAgent, epsilon_greedy, ucb
+from mcts.agents import MCTSAgent, epsilon_greedy, rave, ucb
+from mcts.book import OpeningBook
 from mcts.connectfour import CConnectFourEnv
-from mcts.tictactoe import CTicTacToeEnv
+from mcts.tictactoe import CTicTacToeEnv, PerfectPlayTable
 
 
 def make_parser():
@@ -17,7 +18,7 @@ def make_parser():
                         default='ConnectFour',
                         help='the game')
     parser.add_argument('--tree_policy1',
-                        choices=['epsilon_greedy', 'ucb'],
+                        choices=['epsilon_greedy', 'ucb', 'rave'],
                         default='epsilon_greedy',
                         help='the type of tree policy for agent 1')
     parser.add_argument('--epsilon1',
@@ -26,14 +27,32 @@ def make_parser():
                         help='the value of epsilon for agent 1 if using epsilon greedy')
     parser.add_argument('--c1',
                         type=float,
-                        default=np.sqrt(2),
-                        help='the value of c for agent 1 if using ucb')
+                        help='the value of c for agent 1 if using ucb or rave, '
+                             'by default sqrt(2) for ucb and 0.5 for rave')
+    parser.add_argument('--k1',
+                        type=float,
+                        default=100,
+                        help='the number of visits at which AMAF values weigh half for agent 1 if using rave')
     parser.add_argument('--timeout1',
                         type=float,
                         default=1.0,
                         help='timeout in seconds for agent 1')
+    parser.add_argument('--iterations1',
+                        type=int,
+                        help='number of simulations per move for agent 1, instead of the timeout')
+    parser.add_argument('--nodes1',
+                        type=int,
+                        help='number of new tree nodes per move for agent 1, instead of the timeout')
+    parser.add_argument('--ponder1',
+                        action='store_true',
+                        help='let agent 1 search on the time of agent 2, sharing the same process')
+    parser.add_argument('--perfect1',
+                        action='store_true',
+                        help='let agent 1 look up the exact values of TicTacToe positions')
+    parser.add_argument('--book1',
+                        help='the opening book file for agent 1, as written by build_book.py')
     parser.add_argument('--tree_policy2',
-                        choices=['epsilon_greedy', 'ucb'],
+                        choices=['epsilon_greedy', 'ucb', 'rave'],
                         default='epsilon_greedy',
                         help='the type of tree policy for agent 2')
     parser.add_argument('--epsilon2',
@@ -42,12 +61,30 @@ def make_parser():
                         help='the value of epsilon for agent 2 if using epsilon greedy')
     parser.add_argument('--c2',
                         type=float,
-                        default=np.sqrt(2),
-                        help='the value of c for agent 2 if using ucb')
+                        help='the value of c for agent 2 if using ucb or rave, '
+                             'by default sqrt(2) for ucb and 0.5 for rave')
+    parser.add_argument('--k2',
+                        type=float,
+                        default=100,
+                        help='the number of visits at which AMAF values weigh half for agent 2 if using rave')
     parser.add_argument('--timeout2',
                         type=float,
                         default=1.0,
                         help='timeout in seconds for agent 2')
+    parser.add_argument('--iterations2',
+                        type=int,
+                        help='number of simulations per move for agent 2, instead of the timeout')
+    parser.add_argument('--nodes2',
+                        type=int,
+                        help='number of new tree nodes per move for agent 2, instead of the timeout')
+    parser.add_argument('--ponder2',
+                        action='store_true',
+                        help='let agent 2 search on the time of agent 1, sharing the same process')
+    parser.add_argument('--perfect2',
+                        action='store_true',
+                        help='let agent 2 look up the exact values of TicTacToe positions')
+    parser.add_argument('--book2',
+                        help='the opening book file for agent 2, as written by build_book.py')
     parser.add_argument('--samples',
                         type=int,
                         default=10,
@@ -57,20 +94,41 @@ def make_parser():
 
 def make_agents(args):
     """Return the list of agents for this run."""
+    table = None
+    if args.perfect1 or args.perfect2:
+        if args.env != 'TicTacToe':
+            raise ValueError('perfect play tables are only available for TicTacToe')
+        table = PerfectPlayTable.build()
     if args.tree_policy1 == 'epsilon_greedy':
         tree_policy1 = epsilon_greedy(epsilon=args.epsilon1)
     elif args.tree_policy1 == 'ucb':
-        tree_policy1 = ucb(c=args.c1)
+        tree_policy1 = ucb(c=np.sqrt(2) if args.c1 is None else args.c1)
+    elif args.tree_policy1 == 'rave':
+        tree_policy1 = rave(c=0.5 if args.c1 is None else args.c1, k=args.k1)
     else:
         raise ValueError('invalid policy type for agent 1')
-    agent1 = MCTSAgent(tree_policy=tree_policy1, timeout=args.timeout1)
+    agent1 = MCTSAgent(tree_policy=tree_policy1,
+                       timeout=args.timeout1 if args.iterations1 is None and args.nodes1 is None else None,
+                       iterations=args.iterations1,
+                       nodes=args.nodes1,
+                       ponder=args.ponder1,
+                       exact=table if args.perfect1 else None,
+                       book=OpeningBook(args.book1) if args.book1 else None)
     if args.tree_policy2 == 'epsilon_greedy':
         tree_policy2 = epsilon_greedy(epsilon=args.epsilon2)
     elif args.tree_policy2 == 'ucb':
-        tree_policy2 = ucb(c=args.c2)
+        tree_policy2 = ucb(c=np.sqrt(2) if args.c2 is None else args.c2)
+    elif args.tree_policy2 == 'rave':
+        tree_policy2 = rave(c=0.5 if args.c2 is None else args.c2, k=args.k2)
     else:
         raise ValueError('invalid policy type for agent 2')
-    agent2 = MCTSAgent(tree_policy=tree_policy2, timeout=args.timeout2)
+    agent2 = MCTSAgent(tree_policy=tree_policy2,
+                       timeout=args.timeout2 if args.iterations2 is None and args.nodes2 is None else None,
+                       iterations=args.iterations2,
+                       nodes=args.nodes2,
+                       ponder=args.ponder2,
+                       exact=table if args.perfect2 else None,
+                       book=OpeningBook(args.book2) if args.book2 else None)
     return [agent1, agent2]
 
 
@@ -96,6 +154,8 @@ def run_episode(agents, env):
         _, reward, done, _ = env.step(action)
         total_reward += reward
         steps += 1
+    for agent in agents:
+        agent.stop_pondering()
     return total_reward, steps
 
 
@@ -0,0 +1,324 @@
+"""Tests for the agents."""
+
+from mcts.agents import *
+from mcts.connectfour import CConnectFourEnv
+from mcts.tictactoe import CTicTacToeEnv, PerfectPlayTable
+
+import random
+import time
+
+import numpy as np
+import pytest
+
+
+def test_ArrayTree_0():
+    env = CConnectFourEnv()
+    tree = ArrayTree(env.players, capacity=2)
+    assert tree.add(-1, np.zeros((1, 2)), [env]) == 0
+    assert tree.add(0, np.ones((7, 2)), [env.copy() for _ in range(7)]) == 1
+    assert len(tree) == 8
+    assert list(tree.children(0)) == [1, 2, 3, 4, 5, 6, 7]
+    assert np.array_equal(tree.action[1:8], np.arange(7))
+    assert np.all(tree.parent[1:8] == 0)
+    assert np.all(tree.reward[1:8] == 1)
+
+def test_ArrayMCTSAgent_0():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 1), (0, 1), (2, 2)]:
+        env.step(action)
+    agent = ArrayMCTSAgent(timeout=0.2)
+    assert agent.act(env) == (0, 2)
+    assert agent.tree.visits[0] == agent.tree.visits[agent.tree.children(0)].sum() + 1
+
+def test_ucb_0():
+    policy = ucb(c=1.0)
+    assert policy.select(np.array([3, 0, 2, 0]), np.array([0.5, 0.0, 0.1, 0.0]), 6) == 1
+    assert policy.select(np.array([3, 1, 2]), np.array([0.5, -0.5, 0.1]), 6) == 0
+    assert policy.select(np.array([30, 1, 2]), np.array([0.5, -0.5, 0.1]), 33) == 2
+
+def test_epsilon_greedy_0():
+    policy = epsilon_greedy(epsilon=0.0)
+    assert policy.select(np.array([3, 1, 2]), np.array([0.5, -0.5, 0.7]), 6) == 2
+
+def test_RootParallelMCTSAgent_0():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 1), (0, 1), (2, 2)]:
+        env.step(action)
+    agent = RootParallelMCTSAgent(timeout=0.2, workers=2)
+    try:
+        assert agent.act(env) == (0, 2)
+        assert agent.simulations == sum(visits for visits, _ in agent.stats.values()) + 2
+    finally:
+        agent.close()
+
+def test_TreeParallelMCTSAgent_0():
+    env = CConnectFourEnv()
+    agent = TreeParallelMCTSAgent(timeout=None, iterations=20000, threads=4)
+    assert agent.act(env) in env.actions
+    assert agent.simulations == 20000
+    assert agent.simulations == 1 + sum(visits for visits, _ in agent.stats.values())
+    assert all(abs(value) <= 1 for _, value in agent.stats.values())
+    for _ in range(4):
+        env.step(agent.act(env))
+    assert agent.simulations == 1 + sum(visits for visits, _ in agent.stats.values())
+
+def test_LeafParallelMCTSAgent_0():
+    env = CConnectFourEnv()
+    for action in [0, 1, 0, 1, 0]:
+        env.step(action)
+    agent = LeafParallelMCTSAgent(timeout=0.2, playouts=8)
+    assert agent.act(env) == 0
+    assert agent.root.visits % 8 == 0
+
+def test_LeafParallelMCTSAgent_1():
+    with pytest.raises(ValueError):
+        LeafParallelMCTSAgent(tree_policy=rave())
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        env.step(action)
+    agent = LeafParallelMCTSAgent(playouts=8, exact=PerfectPlayTable.build())
+    node = agent.find_root(env)
+    assert np.array_equal(agent.simulate(node), [8, -8])
+
+def test_LeafParallelMCTSAgent_2():
+    env = CConnectFourEnv()
+    agent = LeafParallelMCTSAgent(timeout=None, iterations=400, playouts=16, early_stop=True)
+    agent.act(env)
+    visits = sorted(child.visits for child in agent.root.children)
+    assert visits[-1] - visits[-2] > 16 * (400 - agent.simulations)
+
+def test_MCTSAgent_table_0():
+    env = CTicTacToeEnv()
+    agent = MCTSAgent(timeout=0.2, table_size=1 << 16)
+    assert agent.act(env) in env.actions
+    nodes = [agent.root]
+    for depth in range(3):
+        nodes = [child for node in nodes for child in node.children]
+    assert len({id(node) for node in nodes}) < len(nodes)
+
+def test_MCTSAgent_table_1():
+    for seed in range(40):
+        random.seed(seed)
+        env = CTicTacToeEnv()
+        agent = MCTSAgent(timeout=None, iterations=100, lazy=seed % 2 == 0, table_size=1 << 12)
+        visits = 0
+        while not env.done:
+            action = agent.act(env)
+            assert action in env.actions
+            assert agent.root.visits == visits + agent.simulations
+            env.step(action)
+            if not env.done:
+                env.step(random.choice(env.actions))
+                visits = next((node.visits for node in agent.chosen.children
+                               if node.env.hash == env.hash), 0)
+
+def test_MCTSAgent_find_root_0():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=0.2)
+    env.step(agent.act(env))
+    reply = max(agent.chosen.children, key=lambda node: node.visits)
+    visits = reply.visits
+    env.step(reply.action)
+    agent.act(env)
+    assert agent.root is reply
+    assert agent.root.parent is None
+    assert agent.root.visits > visits
+
+def test_MCTSAgent_lazy_0():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 1), (0, 1), (2, 2)]:
+        env.step(action)
+    agent = MCTSAgent(timeout=0.2, lazy=True)
+    assert agent.act(env) == (0, 2)
+    assert sorted(node.action for node in agent.root.children) == sorted(env.actions)
+
+def test_MCTSAgent_lazy_1():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(lazy=True, action_order=lambda env, action: -abs(action - 3))
+    assert [agent.expand(agent.find_root(env)).action for _ in range(3)] == [3, 3, 3]
+    root = agent.find_root(env)
+    assert [agent.expand(root).action for _ in range(3)] == [3, 2, 4]
+
+def test_MCTSAgent_budget_0():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=None, iterations=50)
+    agent.act(env)
+    assert agent.simulations == 50
+    assert agent.root.visits == 50
+    agent = MCTSAgent(timeout=None, nodes=50, lazy=True)
+    agent.act(env)
+    assert agent.nodes_added == 50
+    with pytest.raises(ValueError):
+        MCTSAgent(timeout=None)
+
+def test_NativeMCTSAgent_0():
+    # X to move wins at (0, 2), and after that O must block at (0, 2)
+    for moves in [[(0, 0), (1, 0), (0, 1), (1, 1)], [(0, 0), (1, 1), (0, 1)]]:
+        env = CTicTacToeEnv()
+        for action in moves:
+            env.step(action)
+        agent = MCTSAgent(timeout=None, iterations=2000)
+        native = NativeMCTSAgent(timeout=None, iterations=2000)
+        assert agent.act(env) == native.act(env) == (0, 2)
+        assert native.simulations == 2000
+        for child in agent.root.children:
+            visits, value = native.stats[child.action]
+            assert abs(visits - child.visits) < 200
+        visits, value = native.stats[(0, 2)]
+        assert abs(value - agent.chosen.value[env.turn]) < 0.2
+
+def test_MCTSAgent_max_nodes_0():
+    for on_full in ['prune', 'freeze']:
+        env = CConnectFourEnv()
+        agent = MCTSAgent(timeout=None, iterations=500, max_nodes=100, on_full=on_full)
+        for _ in range(2):
+            env.step(agent.act(env))
+            assert agent.root.visits >= 500
+            assert agent.tree_size == count_nodes(agent.root)
+            assert agent.tree_size <= 100 + 7
+            assert 100 <= agent.peak_size <= 100 + 7
+
+def test_MCTSAgent_max_nodes_1():
+    random.seed(0)
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=None, iterations=3000, max_nodes=150, table_size=1 << 12)
+    for _ in range(4):
+        env.step(agent.act(env))
+        assert agent.tree_size == count_nodes(agent.root)
+        assert agent.tree_size <= 150 + 7
+        assert agent.peak_size <= 150 + 7
+
+def test_MCTSAgent_max_nodes_2():
+    for seed in range(5):
+        random.seed(seed)
+        env = CConnectFourEnv()
+        agent = MCTSAgent(timeout=None, iterations=300, max_nodes=2000, table_size=1 << 12)
+        while not env.done:
+            env.step(agent.act(env))
+            assert agent.tree_size == count_nodes(agent.root)
+            if not env.done:
+                env.step(random.choice(env.actions))
+
+def test_MCTSAgent_early_stop_0():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        env.step(action)
+    agent = MCTSAgent(timeout=None, iterations=2000, early_stop=True)
+    assert agent.act(env) == (0, 2)
+    assert agent.simulations < 2000
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (1, 2), (2, 1), (2, 0)]:
+        env.step(action)
+    assert agent.act(env) == (2, 2)
+    assert agent.simulations == 0
+
+def test_MCTSAgent_ponder_0():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=None, iterations=100, ponder=True)
+    env.step(agent.act(env))
+    assert agent.ponder_thread is not None
+    assert agent.root is agent.chosen
+    time.sleep(0.1)
+    env.step(env.actions[0])
+    agent.stop_pondering()
+    assert agent.ponder_thread is None
+    assert agent.pondered > 0
+    agent.ponder = False
+    agent.act(env)
+    assert agent.root.visits > 100
+
+def test_MCTSAgent_ponder_1():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=None, iterations=100, ponder=True, max_nodes=500)
+    env.step(agent.act(env))
+    agent.ponder_thread.join(timeout=10)
+    assert not agent.ponder_thread.is_alive()
+    assert 500 <= agent.tree_size < 500 + len(env.actions)
+    agent.stop_pondering()
+
+def test_MCTSAgent_zero_sum_0():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        env.step(action)
+    agent = MCTSAgent(timeout=None, iterations=500, zero_sum=True)
+    assert agent.act(env) == (0, 2)
+    assert agent.chosen.value == 1.0
+    assert agent.root.sign == -1.0
+    stats = []
+    for zero_sum in [False, True]:
+        random.seed(0)
+        agent = LeafParallelMCTSAgent(timeout=None, iterations=100, zero_sum=zero_sum)
+        agent.act(CConnectFourEnv())
+        stats.append([(child.visits, child.value if zero_sum else child.value[0])
+                      for child in agent.root.children])
+    assert np.allclose(stats[0], stats[1])
+
+def test_MCTSAgent_solver_0():
+    for zero_sum in [False, True]:
+        env = CTicTacToeEnv()
+        for action in [(0, 0), (1, 1), (0, 1)]:
+            env.step(action)
+        agent = MCTSAgent(timeout=None, iterations=5000, zero_sum=zero_sum, solver=True)
+        assert agent.act(env) == (0, 2)
+        assert np.array_equal(agent.root.proven, [0, 0])
+        assert agent.simulations < 5000
+        env.step((0, 2))
+        env.step((2, 0))
+        assert agent.act(env) == (1, 0)
+        assert agent.root.proven is not None
+
+def test_MCTSAgent_solver_1():
+    for seed in range(10):
+        random.seed(seed)
+        env = CConnectFourEnv()
+        agent = MCTSAgent(timeout=None, iterations=200, solver=True, max_nodes=60, lazy=True)
+        while not env.done:
+            action = agent.act(env)
+            assert action in env.actions
+            env.step(action)
+            if not env.done:
+                env.step(random.choice(env.actions))
+
+def test_MCTSAgent_solver_2():
+    # after a corner only the center draws, and after the center only a corner
+    for first, replies in [((0, 0), [(1, 1)]), ((1, 1), [(0, 0), (0, 2), (2, 0), (2, 2)])]:
+        random.seed(0)
+        env = CTicTacToeEnv()
+        env.step(first)
+        agent = MCTSAgent(timeout=None, iterations=8000, solver=True)
+        assert agent.act(env) in replies
+        assert np.array_equal(agent.root.proven, [0, 0])
+        assert agent.simulations < 8000
+
+def test_rave_0():
+    policy = rave(c=0.5, k=100)
+    assert policy.select(np.array([1, 0, 0]), np.zeros(3), 1, np.array([1.0, -1.0, 0.5])) == 2
+    assert policy.select(np.array([1, 1]), np.array([0.0, 0.1]), 2, np.array([1.0, 0.0])) == 0
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        env.step(action)
+    agent = MCTSAgent(tree_policy=policy, timeout=None, iterations=200)
+    assert agent.act(env) == (0, 2)
+    assert all(child.amaf_visits >= child.visits for child in agent.root.children)
+
+def test_MCTSAgent_widening_0():
+    env = CConnectFourEnv()
+    agent = MCTSAgent(timeout=None, iterations=16, widening=(1.0, 0.5))
+    agent.act(env)
+    assert agent.lazy
+    assert len(agent.root.children) <= 1 + int(16 ** 0.5)
+    for node in walk(agent.root):
+        assert len(node.children) <= 1 + int(node.visits ** 0.5)
+
+def test_MCTSAgent_exact_0():
+    table = PerfectPlayTable.build()
+    agents = [MCTSAgent(exact=table), MCTSAgent(exact=table)]
+    env = CTicTacToeEnv()
+    total_rewards = np.zeros(2)
+    while not env.done:
+        action = agents[env.turn].act(env)
+        assert agents[env.turn].simulations == 0
+        assert action in table.best_actions(env)
+        _, rewards, _, _ = env.step(action)
+        total_rewards += rewards
+    assert np.array_equal(total_rewards, [0, 0])
@@ -0,0 +1,53 @@
+"""Tests for the opening books."""
+
+from mcts.agents import MCTSAgent, NativeMCTSAgent
+from mcts.book import *
+from mcts.connectfour import CConnectFourEnv
+
+import pytest
+
+
+def test_OpeningBook_0(tmp_path):
+    path = str(tmp_path / 'connectfour.book')
+    env = CConnectFourEnv()
+    assert build_book(path, env, NativeMCTSAgent(timeout=None, iterations=2000), 2) == 8
+    book = OpeningBook(path)
+    assert len(book) == 56
+    stats = book.lookup(env)
+    assert sorted(action for action, _, _ in stats) == env.actions
+    assert sum(visits for _, visits, _ in stats) == 1999
+    assert book.move(env) == max(stats, key=lambda stat: stat[1])[0]
+    agent = MCTSAgent(timeout=None, iterations=100, book=book)
+    assert agent.act(env) == book.move(env)
+    assert agent.simulations == 0 and agent.root is None
+    for action in [3, 3]:
+        env.step(action)
+    assert book.lookup(env) == []
+    agent.act(env)
+    assert agent.simulations == 100
+    book.close()
+
+def test_OpeningBook_1(tmp_path):
+    path = str(tmp_path / 'invalid.book')
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 16)
+    with pytest.raises(ValueError):
+        OpeningBook(path)
+
+def test_OpeningBook_2(tmp_path):
+    path = str(tmp_path / 'truncated.book')
+    write_book(path, [(1, 0, 10, 0.5), (2, 1, 20, -0.5)])
+    with open(path, 'rb') as f:
+        data = f.read()
+    for size in [12, len(data) - 1]:
+        with open(path, 'wb') as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError):
+            OpeningBook(path)
+    with open(path, 'wb') as f:
+        f.write(data[:8] + np.array([1 << 60], dtype='<u8').tobytes() + data[16:])
+    with pytest.raises(ValueError):
+        OpeningBook(path)
+    with open(path, 'wb') as f:
+        f.write(data)
+    assert len(OpeningBook(path)) == 2
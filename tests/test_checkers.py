@@ -2,6 +2,9 @@
 
 from mcts.checkers import *
 
+import pickle
+import random
+
 import numpy as np
 import pytest
 
@@ -19,4 +22,99 @@ def test_CheckersEnv_1():
     env.reset()
     env.step(((2, 7),(3,6)))
     assert env.done == False
-    assert env.turn == 1
\ No newline at end of file
+    assert env.turn == 1
+
+def test_CheckersEnv_2():
+    env = CCheckersEnv()
+    env.step(((2, 1), (3, 2)))
+    copy = pickle.loads(pickle.dumps(env))
+    assert np.array_equal(copy.board, env.board)
+    assert copy.actions == env.actions
+    assert copy.turn == 1
+
+def test_CheckersEnv_3():
+    env = CCheckersEnv()
+    assert env.priorities == [0] * len(env.actions)
+    env.step(((2, 1), (3, 2)))
+    env.step(((5, 4), (4, 3)))
+    assert env.priorities[env.actions.index(((3, 2), (5, 4)))] == 2
+
+def test_CheckersEnv_4():
+    env = CCheckersEnv()
+    for action in [((2, 1), (3, 2)), ((5, 4), (4, 3)), ((3, 2), (5, 4))]:
+        _, rewards, done, _ = env.step(action)
+    assert env.board[4, 3] == 0 and env.board[3, 2] == 0 and env.board[5, 4] == 1
+    assert np.count_nonzero(env.board == -1) == 11
+    jumps = [action for action in env.actions if abs(action[0][0] - action[1][0]) == 2]
+    assert sorted(jumps) == [((6, 3), (4, 5)), ((6, 5), (4, 3))]
+    assert pickle.loads(pickle.dumps(env)).hash == env.hash
+
+def test_CheckersEnv_5():
+    for seed in range(200):
+        random.seed(seed)
+        env = CCheckersEnv()
+        for _ in range(random.randrange(150)):
+            if env.done:
+                break
+            env.step(random.choice(env.actions))
+        if env.done:
+            continue
+        for heavy in [False, True]:
+            rewards = env.rollout(16, seed, heavy=heavy)
+            assert rewards.shape == (16, 2)
+            assert np.all(rewards.sum(axis=1) == 0)
+            assert np.sum(env.playout(seed, heavy=heavy)) == 0
+
+def test_CheckersEnv_6():
+    found = 0
+    for seed in range(50):
+        random.seed(seed)
+        env = CCheckersEnv()
+        while not env.done:
+            for action in env.actions:
+                _, rewards, done, _ = env.copy().step(action)
+                if done and rewards[env.turn] > 0:
+                    # the heavy playouts take the win at once
+                    assert np.all(env.rollout(8, seed, heavy=True)[:, env.turn] == 1)
+                    found += 1
+                    break
+            env.step(random.choice(env.actions))
+    assert found > 0
+
+def test_VecCheckersEnv_0():
+    env = VecCheckersEnv(16)
+    envs = [CCheckersEnv() for _ in range(16)]
+    assert np.array_equal(env.reset(), [copy.board for copy in envs])
+    games = 0
+    for seed in range(400):
+        mask = env.legal_mask()
+        for i, copy in enumerate(envs):
+            assert mask[i].tolist() == [j < len(copy.actions) for j in range(mask.shape[1])]
+        actions = env.random_actions(seed)
+        boards, rewards, dones, _ = env.step(actions)
+        for i, action in enumerate(actions):
+            _, reward, done, _ = envs[i].step(envs[i].actions[action])
+            assert np.array_equal(rewards[i], reward)
+            assert dones[i] == done
+            if done:
+                envs[i] = CCheckersEnv()
+                games += 1
+            assert np.array_equal(boards[i], envs[i].board)
+        assert env.turn.tolist() == [copy.turn for copy in envs]
+    assert games > 8
+    boards = env.board
+    with pytest.raises(ValueError):
+        env.step([len(copy.actions) for copy in envs])
+    assert np.array_equal(env.board, boards)
+
+def test_VecCheckersEnv_1():
+    env = VecCheckersEnv(8, move_limit=10)
+    env.reset(16)
+    for seed in range(9):
+        _, rewards, dones, _ = env.step(env.random_actions(seed))
+        assert not dones.any()
+    boards, rewards, dones, _ = env.step(env.random_actions(9))
+    assert dones.all()
+    assert not rewards.any()
+    assert np.array_equal(boards, [CCheckersEnv().board] * 16)
+    assert env.turn.tolist() == [0] * 16
@@ -2,6 +2,8 @@
 
 from mcts.connectfour import *
 
+import pickle
+
 import numpy as np
 import pytest
 
@@ -23,3 +25,82 @@ def test_ConnectFourEnv_1():
     assert np.array_equal(env.board, np.array([[0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 1]], dtype=np.int))
     assert env.done == False
     assert env.actions == [0,1,2,3,4,5,6]
+
+def test_ConnectFourEnv_2():
+    env = CConnectFourEnv()
+    env.step(3)
+    env.step(3)
+    copy = pickle.loads(pickle.dumps(env))
+    assert np.array_equal(copy.board, env.board)
+    assert copy.turn == 0
+    copy.step(3)
+    env.step(3)
+    assert np.array_equal(copy.board, env.board)
+
+def test_ConnectFourEnv_3():
+    env = CConnectFourEnv()
+    for action in [0, 1, 0, 1, 0, 1]:
+        env.step(action)
+    rewards = env.rollout(100, 0)
+    assert rewards.shape == (100, 2)
+    assert np.array_equal(rewards, env.rollout(100, 0))
+    assert np.all(rewards.sum(axis=1) == 0)
+    assert np.array_equal(env.board, np.array([[0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0], [1, -1, 0, 0, 0, 0, 0], [1, -1, 0, 0, 0, 0, 0], [1, -1, 0, 0, 0, 0, 0]]))
+
+def test_ConnectFourEnv_4():
+    env = CConnectFourEnv()
+    for action in [0, 1, 0, 1, 0, 1]:
+        env.step(action)
+    assert np.all(env.rollout(100, 0, heavy=True) == [1, -1])
+    env.step(6)
+    assert np.all(env.rollout(100, 0, heavy=True) == [-1, 1])
+    env.step(2)
+    assert np.all(env.rollout(100, 0, heavy=True) == [1, -1])
+
+def test_VecConnectFourEnv_0():
+    env = VecConnectFourEnv(64)
+    env.reset()
+    games = 0
+    for seed in range(200):
+        mask = env.legal_mask()
+        actions = env.random_actions(seed)
+        assert mask[np.arange(64), actions].all()
+        _, rewards, dones, _ = env.step(actions)
+        assert np.all(rewards.sum(axis=1) == 0)
+        assert np.all(rewards[~dones] == 0)
+        games += dones.sum()
+    assert games > 64
+    env.reset(8)
+    assert env.board.shape == (8, 6, 7)
+
+def test_ConnectFourEnv_5():
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        env1 = PyConnectFourEnv()
+        env2 = CConnectFourEnv()
+        while not env1.done:
+            assert env1.actions == env2.actions
+            action = env1.actions[rng.randint(len(env1.actions))]
+            board1, rewards1, done1, _ = env1.step(action)
+            board2, rewards2, done2, _ = env2.step(action)
+            assert np.array_equal(board1, board2)
+            assert np.array_equal(rewards1, rewards2)
+            assert done1 == done2
+
+def test_ConnectFourEnv_6():
+    env = CConnectFourEnv()
+    assert env.legal_mask == 0b1111111
+    for action in [2] * 6 + [5] * 6:
+        env.step(action)
+    assert env.legal_mask == 0b1011011
+    assert env.actions == [0, 1, 3, 4, 6]
+    copy = pickle.loads(pickle.dumps(env))
+    assert copy.legal_mask == env.legal_mask
+
+def test_ConnectFourEnv_7():
+    env = CConnectFourEnv()
+    board = env.board
+    state, _, _, _ = env.step(3)
+    assert state is not board and state.flags.writeable
+    env.step(3)
+    assert state[4, 3] == 0 and env.board is board and board[4, 3] == -1
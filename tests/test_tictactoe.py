@@ -2,6 +2,9 @@
 
 from mcts.tictactoe import *
 
+import pickle
+import tracemalloc
+
 import numpy as np
 import pytest
 
@@ -36,4 +39,112 @@ def test_TicTacToeEnv_2():
     env.step((1, 1))
     assert np.array_equal(env.board, np.array([[0, 0, 0], [0, 1, 0], [0, 0, 0]], dtype=np.int))
     
-    
\ No newline at end of file
+    
+def test_TicTacToeEnv_3():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 1), (0, 1), (1, 0)]:
+        env.step(action)
+    assert np.array_equal(env.playout(1), env.playout(1))
+    assert np.sum(env.playout(2)) == 0
+    env.step((0, 2))
+    assert np.array_equal(env.playout(1), [0, 0])
+
+def test_TicTacToeEnv_4():
+    env1 = CTicTacToeEnv()
+    env2 = CTicTacToeEnv()
+    for action in [(0, 0), (1, 1), (2, 2)]:
+        env1.step(action)
+    for action in [(2, 2), (1, 1), (0, 0)]:
+        env2.step(action)
+    assert env1.hash == env2.hash
+    env1.step((0, 1))
+    assert env1.hash != env2.hash
+
+def test_TicTacToeEnv_5():
+    env = CTicTacToeEnv()
+    for action in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        env.step(action)
+    assert all(np.array_equal(env.playout(seed, heavy=True), [1, -1]) for seed in range(20))
+
+def test_TicTacToeEnv_6():
+    env = CTicTacToeEnv()
+    assert env.legal_mask == 0b111111111
+    for action in [(0, 0), (1, 0), (1, 1), (2, 0)]:
+        env.step(action)
+    assert env.legal_mask == 0b110100110
+    assert env.actions == [(0, 1), (0, 2), (1, 2), (2, 1), (2, 2)]
+    copy = pickle.loads(pickle.dumps(env))
+    _, rewards, done, _ = copy.step((2, 2))
+    assert done and np.array_equal(rewards, [1, -1])
+    assert np.array_equal(copy.board, [[1, 0, 0], [-1, 1, 0], [-1, 0, 1]])
+    assert not env.done
+
+def test_TicTacToeEnv_7():
+    env = CTicTacToeEnv()
+    board = env.board
+    assert not board.flags.writeable
+    assert env.board is board
+    state = env.reset()
+    assert state is not board and state.flags.writeable
+    state, _, _, _ = env.step((1, 1))
+    assert state is not board and env.board[1, 1] == 1
+    env.step((0, 0))
+    assert state[0, 0] == 0 and env.board is board and board[0, 0] == -1
+    out = env.write_board(np.zeros((3, 3), dtype=np.intc))
+    assert np.array_equal(out, board)
+    with pytest.raises(ValueError):
+        env.write_board(np.zeros((2, 3), dtype=np.intc))
+
+def test_TicTacToeEnv_8():
+    env = CTicTacToeEnv()
+    env.board
+    copies = []
+    tracemalloc.start()
+    for _ in range(100):
+        copy = env.copy()
+        board, _, _, _ = copy.step((1, 1))
+        assert board.flags.writeable and board[1, 1] == 1
+        copies.append(copy)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the env alone, without a board view
+    assert size < 100 * 200
+
+def test_PerfectPlayTable_0():
+    table = PerfectPlayTable.build()
+    assert len(table) == 5478
+    env = CTicTacToeEnv()
+    assert np.array_equal(table(env), [0, 0])
+    assert len(table.best_actions(env)) == 9
+    for action in [(0, 0), (1, 1), (2, 2)]:
+        env.step(action)
+    assert np.array_equal(table(env), [0, 0])
+    assert table.best_actions(env) == [(0, 1), (1, 0), (1, 2), (2, 1)]
+    env.step((0, 2))
+    assert np.array_equal(table(env), [1, -1])
+    copies = [env.copy() for _ in range(100)]
+    tracemalloc.start()
+    for copy in copies:
+        table(copy)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # no board view is kept by the envs
+    assert size < 100 * 100
+
+def test_VecTicTacToeEnv_0():
+    env = VecTicTacToeEnv(2)
+    assert env.reset().shape == (2, 3, 3)
+    for moves in [[0, 4], [3, 0], [1, 2]]:
+        _, rewards, dones, _ = env.step(moves)
+        assert not dones.any()
+    assert env.legal_mask()[1].tolist() == [False, True, False, True, False, True, True, True, True]
+    with pytest.raises(ValueError):
+        env.step([4, 0])
+    for moves in [[4, 6], [8, 3]]:
+        _, rewards, dones, _ = env.step(moves)
+        assert not dones.any()
+    boards, rewards, dones, _ = env.step([5, 5])
+    assert dones.tolist() == [True, False]
+    assert rewards.tolist() == [[-1, 1], [0, 0]]
+    assert not boards[0].any()
+    assert env.turn.tolist() == [0, 0]